@@ -210,9 +210,12 @@ def read_diet_plan(db: firestore.Client, pid: str, week: str) -> Optional[DietPl
 
 
 def read_workouts(db: firestore.Client, ids: List[str]) -> List[Dict[str, Any]]:
+    # one get_all (BatchGetDocuments) round-trip for the distinct ids instead of a get() each
+    refs = [db.collection("workouts").document(wid) for wid in dict.fromkeys(ids)]
+    snaps = {snap.id: snap for snap in db.get_all(refs)}
     out: List[Dict[str, Any]] = []
     for wid in ids:
-        snap = db.collection("workouts").document(wid).get()
+        snap = snaps[wid]
         if not snap.exists:
             out.append({"id": wid, "title": wid, "exercises": []})
             continue
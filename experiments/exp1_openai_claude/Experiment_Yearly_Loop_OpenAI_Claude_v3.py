@@ -110,7 +110,8 @@ def exists(db: firestore.Client, path: str) -> bool:
 
 
 def list_persona_ids(db: firestore.Client) -> list[str]:
-    ids = [doc.id for doc in db.collection("personas").stream()]
+    # keys-only projection: only document names come back, not the persona payloads
+    ids = [doc.id for doc in db.collection("personas").select([]).stream()]
     ids.sort()
     return ids
 
@@ -133,9 +134,12 @@ def pick_workouts(days_per_week: int) -> list[str]:
 
 
 def read_workout_blurbs(db: firestore.Client, workout_ids: list[str]) -> dict[str, str]:
+    # one get_all (BatchGetDocuments) round-trip for the distinct ids instead of a get() each
+    refs = [db.document(f"workouts/{wid}") for wid in dict.fromkeys(workout_ids)]
+    docs = {snap.id: strip_nanoseconds(snap.to_dict() or {}) for snap in db.get_all(refs)}
     out = {}
     for wid in workout_ids:
-        d = read_doc(db, f"workouts/{wid}")
+        d = docs.get(wid, {})
         out[wid] = d.get("summary") or d.get("title") or wid
     return out
 
@@ -1,5 +1,6 @@
 
-import json, re, requests, hashlib, random, math
+import re, requests, hashlib, random, math
+import orjson
 from typing import Any, Dict, Optional, Tuple, List
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
@@ -83,7 +84,7 @@ def _extract_text_from_completion_json(resp_json: dict) -> str:
 FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
 KEYCOLON_RE = re.compile(r'"\s*[^"]+\s*"\s*:')
 def _try_json(s: str) -> Optional[dict]:
-    try: return json.loads(s)
+    try: return orjson.loads(s)
     except Exception: return None
 def extract_first_json(text: str) -> Optional[dict]:
     for m in FENCE_RE.finditer(text or ""):
@@ -422,13 +423,8 @@ def call_acegpt(persona_id: str, persona_data: dict) -> Optional[dict]:
     # Compose meals and compute accurate macros per meal
     for idx, (name_key, kcal_key, c_key, f_key, p_key, fi_key, na_key) in enumerate(MEAL_KEYS, start=1):
         text, m = _compose_meal(idx, persona_id)
-        obj[name_key] = text
-        obj[kcal_key] = m["kcal"]
-        obj[c_key]    = m["carb"]
-        obj[f_key]    = m["fat"]
-        obj[p_key]    = m["prot"]
-        obj[fi_key]   = m["fib"]
-        obj[na_key]   = m["na"]
+        obj.update({name_key: text, kcal_key: m["kcal"], c_key: m["carb"], f_key: m["fat"],
+                    p_key: m["prot"], fi_key: m["fib"], na_key: m["na"]})
 
     # Totals = exact sum of meals
     recompute_totals_from_meals(obj)
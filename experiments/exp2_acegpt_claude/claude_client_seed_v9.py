@@ -1,7 +1,8 @@
 # claude_client_seed_v9.py
-import os, json, math, random, hashlib, datetime, requests
+import os, math, random, hashlib, datetime, requests
+import orjson
 from zoneinfo import ZoneInfo
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 
 from config_seed_v9 import (
     ANTHROPIC_MODEL, ANTHROPIC_URL, CLAUDE_TEMPERATURE, RIYADH_TZ
@@ -44,13 +45,13 @@ def extract_first_json_block(text: str) -> Dict:
     s, e = text.find("{"), text.rfind("}")
     if s == -1 or e == -1 or e <= s:
         raise ValueError("No JSON object found in Claude output.")
-    return json.loads(text[s:e+1])
+    return orjson.loads(text[s:e+1])
 
 # ------------- Prompt builder -------------
-def workouts_payload(workout_ids: List[str], workouts_map: Dict[str, Dict]) -> List[Dict]:
+def workouts_payload(workout_ids: List[str], get_workout: Callable[[str], Dict]) -> List[Dict]:
     out = []
     for wid in workout_ids:
-        wdoc = workouts_map.get(wid) or {}
+        wdoc = get_workout(wid) or {}
         out.append({"workout_id": wid,
                     "title": wdoc.get("title", ""),
                     "exercises": wdoc.get("exercises", [])})
@@ -85,7 +86,7 @@ M3: {diet.get('3rd_meal')} / kcal={diet.get('3rd_meal_kcal_target_kcal')} C={die
 M4: {diet.get('4th_meal')} / kcal={diet.get('4th_meal_kcal_target_kcal')} C={diet.get('4th_meal_carbs_g')} F={diet.get('4th_meal_fat_g')} P={diet.get('4th_meal_protein_g')} Fiber={diet.get('4th_meal_fiber_g')} Na={diet.get('4th_meal_sodium_mg')}
 
 Workouts this week:
-{json.dumps(workouts, ensure_ascii=False)}
+{orjson.dumps(workouts).decode()}
 
 REQUIRED OUTPUT: exactly one JSON object with keys:
 Date, Time, free_text_feedback, notes, daily_avg_kcal,
@@ -236,8 +237,8 @@ def fallback_simulation(pid: str, persona: Dict, diet: Dict, workout_ids: List[s
         "sleep_avg_hours": sleep_avg,
     }
 
-def simulate_week_with_claude(persona: Dict, diet: Dict, workouts_map: Dict[str, Dict], workout_ids: List[str], week_id: str) -> Dict:
-    wkts = workouts_payload(workout_ids, workouts_map)
+def simulate_week_with_claude(persona: Dict, diet: Dict, get_workout: Callable[[str], Dict], workout_ids: List[str], week_id: str) -> Dict:
+    wkts = workouts_payload(workout_ids, get_workout)
 
     # Try Claude first (more diversity); if it fails, fallback is persona-aware
     try:
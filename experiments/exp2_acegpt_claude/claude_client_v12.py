@@ -1,6 +1,7 @@
 # claude_client_v12.py
-import os, json, hashlib, random, datetime, requests
-from typing import Dict, List, Tuple
+import os, hashlib, random, datetime, requests
+import orjson
+from typing import Callable, Dict, List, Tuple
 from zoneinfo import ZoneInfo
 from config_year_v12 import ANTHROPIC_MODEL, ANTHROPIC_URL, CLAUDE_TEMPERATURE, RIYADH_TZ
 
@@ -121,10 +122,13 @@ def simulate_week_with_claude_fallback(persona: Dict, diet: Dict, workouts_ids:
         "sleep_avg_hours": sleep,
     }
 
-def simulate_week_with_claude(persona: Dict, diet: Dict, workouts_map: Dict[str, Dict], workouts_ids: List[str], pid: str, week_id: str, nonce: int = 0) -> Dict:
+def simulate_week_with_claude(persona: Dict, diet: Dict, get_workout: Callable[[str], Dict], workouts_ids: List[str], pid: str, week_id: str, nonce: int = 0) -> Dict:
     # Try API once; if generic or error, use seeded fallback (nonce ensures new variant if we need another attempt)
     try:
-        wkts = [{"workout_id": wid, "title": (workouts_map.get(wid) or {}).get("title",""), "exercises": (workouts_map.get(wid) or {}).get("exercises", [])} for wid in workouts_ids]
+        wkts = []
+        for wid in workouts_ids:
+            wdoc = get_workout(wid) or {}
+            wkts.append({"workout_id": wid, "title": wdoc.get("title",""), "exercises": wdoc.get("exercises", [])})
         prompt = f"""
 Simulate one persona for ONE week. DIVERSITY_TAG={pid}|{week_id}|{nonce}
 Output exactly ONE JSON (no prose) with keys:
@@ -133,9 +137,9 @@ Pre_weight_kg, Pre_muscle_kg, Pre_fat_pct,
 Post_weight_kg, Post_muscle_kg, Post_fat_pct,
 delta_weight_kg, delta_muscle_kg, delta_fat_pct, sleep_avg_hours.
 
-Persona: {json.dumps(persona, ensure_ascii=False)}
-Diet: {json.dumps(diet, ensure_ascii=False)}
-Workouts: {json.dumps(wkts, ensure_ascii=False)}
+Persona: {orjson.dumps(persona).decode()}
+Diet: {orjson.dumps(diet).decode()}
+Workouts: {orjson.dumps(wkts).decode()}
 
 Make free_text_feedback and notes specific to this persona & this week:
 - reference at least ONE meal by name,
@@ -145,7 +149,7 @@ Make free_text_feedback and notes specific to this persona & this week:
 """
         text = call_claude([{"role":"user","content":prompt}], max_tokens=700)
         s,e = text.find("{"), text.rfind("}")
-        data = json.loads(text[s:e+1])
+        data = orjson.loads(text[s:e+1])
         # quick sanity & numeric coerce
         need = ["Date","Time","free_text_feedback","notes","daily_avg_kcal",
                 "Pre_weight_kg","Pre_muscle_kg","Pre_fat_pct",
@@ -5,6 +5,7 @@ SERVICE_ACCOUNT_PATH = r"C:\Users\fakias0a\secrets\fitech-2nd-trail-e978c70041a0
 START_WEEK_ID = "Week_2025_46"
 TOTAL_WEEKS = 54
 INCLUDE_START_WEEK = False  # start the loop from 47 if 46 already exists
+MAX_WORKERS = 16            # personas processed concurrently within a week
 
 WORKOUT_MAP = {
     3: ["W33", "W29", "W21"],
@@ -2,7 +2,7 @@ from google.cloud import firestore
 from google.oauth2 import service_account
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-import json
+import orjson
 from pathlib import Path
 
 from config import PROJECT_ID, SERVICE_ACCOUNT_FILE, validate_config
@@ -39,8 +39,7 @@ def save_diet_plan(db, persona_id: str, week_id: str, payload: dict):
 
 def write_report(report: dict):
     out = Path(__file__).resolve().parent / "last_run_report.json"
-    with out.open("w", encoding="utf-8") as f:
-        json.dump(report, f, ensure_ascii=False, indent=2)
+    out.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
     print(f"[INFO] Run report written to {out}")
 
 def main():
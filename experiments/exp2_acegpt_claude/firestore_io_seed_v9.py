@@ -1,35 +1,87 @@
 # firestore_io_seed_v9.py
+import threading
+from functools import lru_cache
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.oauth2 import service_account
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 from config_seed_v9 import PROJECT_ID, SERVICE_ACCOUNT_PATH
 
-def get_db() -> firestore.Client:
+_DB_LOCK = threading.Lock()
+
+def _warm(db: firestore.Client) -> None:
+    # one keys-only read opens the gRPC channel and fetches the auth token up front,
+    # so the first real read of the run does not pay for it
+    try:
+        next(iter(db.collection("personas").select([]).limit(1).stream()), None)
+    except Exception as e:
+        print(f"[WARN] Firestore warm-up read failed: {e}")
+
+@lru_cache(maxsize=1)
+def _client() -> firestore.Client:
+    # one client (credentials + gRPC channel) per process; the client is thread-safe
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
-    return firestore.Client(project=PROJECT_ID, credentials=creds)
+    db = firestore.Client(project=PROJECT_ID, credentials=creds)
+    _warm(db)
+    return db
+
+def get_db() -> firestore.Client:
+    # lock: concurrent first calls must not each build a client
+    with _DB_LOCK:
+        return _client()
+
+def iter_persona_ids(db, page_size: int = 500) -> Iterator[str]:
+    """Persona ids in document-id order, fetched keys-only in pages of page_size; stop iterating to stop reading."""
+    query = db.collection("personas").select([]).order_by(FieldPath.document_id()).limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        for d in page:
+            yield d.id
+        if len(page) < page_size:
+            return
+        last = page[-1]
 
 def list_persona_ids(db) -> List[str]:
-    docs = db.collection("personas").stream()
-    return sorted([d.id for d in docs])
+    # pages already arrive sorted by id, so no sort here
+    return list(iter_persona_ids(db))
 
 def read_persona(db, pid: str) -> Dict:
     snap = db.collection("personas").document(pid).get()
     return snap.to_dict() or {}
 
+def read_personas_bulk(db, pids: List[str]) -> Dict[str, Dict]:
+    """read_persona for many pids in one get_all (BatchGetDocuments) round-trip."""
+    refs = [db.collection("personas").document(pid) for pid in pids]
+    return {snap.id: snap.to_dict() or {} for snap in db.get_all(refs)}
+
+def _diet_ref(db, user_id: str, week_id: str):
+    return (db.collection("experiments")
+              .document("Experiment_ACEGPT")
+              .collection("users").document(user_id)
+              .collection("weeks").document(week_id)
+              .collection("diet").document("plan"))
+
 def read_diet_for_week(db, user_id: str, week_id: str) -> Optional[Dict]:
-    doc_ref = (db.collection("experiments")
-                 .document("Experiment_ACEGPT")
-                 .collection("users").document(user_id)
-                 .collection("weeks").document(week_id)
-                 .collection("diet").document("plan"))
-    snap = doc_ref.get()
+    snap = _diet_ref(db, user_id, week_id).get()
     return snap.to_dict() if snap.exists else None
 
+def read_diets_for_week_bulk(db, user_ids: List[str], week_id: str) -> Dict[str, Optional[Dict]]:
+    """read_diet_for_week for many users in one get_all round-trip."""
+    refs = [_diet_ref(db, uid, week_id) for uid in user_ids]
+    uid_by_path = {ref.path: uid for ref, uid in zip(refs, user_ids)}
+    return {uid_by_path[s.reference.path]: (s.to_dict() if s.exists else None) for s in db.get_all(refs)}
+
 def read_workout(db, wid: str) -> Optional[Dict]:
     snap = db.collection("workouts").document(wid).get()
     return snap.to_dict() if snap.exists else None
 
+def read_workouts_bulk(db, wids: List[str]) -> Dict[str, Optional[Dict]]:
+    """read_workout for many workout ids in one get_all round-trip."""
+    refs = [db.collection("workouts").document(wid) for wid in wids]
+    return {s.id: (s.to_dict() if s.exists else None) for s in db.get_all(refs)}
+
 def write_logs(db, experiment: str, user_id: str, week_id: str, data: Dict) -> None:
     (db.collection("experiments").document(experiment)
        .collection("users").document(user_id)
@@ -41,3 +93,16 @@ def write_updated_persona(db, experiment: str, user_id: str, week_id: str, data:
        .collection("users").document(user_id)
        .collection("weeks").document(week_id)
        .collection("updated_persona").document("plan")).set(data)
+
+def _week_ref(db, experiment: str, user_id: str, week_id: str):
+    return (db.collection("experiments").document(experiment)
+              .collection("users").document(user_id)
+              .collection("weeks").document(week_id))
+
+def write_persona_bundle(db, user_id: str, week_id: str, logs: Dict, up: Dict) -> None:
+    """Logs + updated_persona (both experiments) for one persona-week in one batch commit."""
+    batch = db.batch()
+    batch.set(_week_ref(db, "Experiment_ACEGPT", user_id, week_id).collection("logs").document("plan"), logs)
+    batch.set(_week_ref(db, "Experiment_ACEGPT", user_id, week_id).collection("updated_persona").document("plan"), up)
+    batch.set(_week_ref(db, "Experiment_OpenAI", user_id, week_id).collection("updated_persona").document("plan"), up)
+    batch.commit()
@@ -1,57 +1,193 @@
 # firestore_io_year_v11.py
-from typing import Dict, List, Optional
+import threading
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.oauth2 import service_account
 from config_year_v11 import PROJECT_ID, SERVICE_ACCOUNT_PATH
 
-def get_db() -> firestore.Client:
+# Diet/updated_persona docs written by this process: {week_id: {path: doc}}. The Python SDK
+# has no offline cache, so reads with source="cache" check here first and fall back to the
+# server. Only the previous week is ever read back, so a new week evicts all but the last one.
+_WRITTEN: Dict[str, Dict[str, Dict]] = {}
+_WRITTEN_LOCK = threading.Lock()
+
+def _remember(week_id: str, ref, data: Dict) -> None:
+    week = _WRITTEN.get(week_id)
+    if week is None:
+        with _WRITTEN_LOCK:
+            week = _WRITTEN.get(week_id)
+            if week is None:
+                for old in list(_WRITTEN)[:-1]:  # keep just the week before this one
+                    del _WRITTEN[old]
+                week = _WRITTEN[week_id] = {}
+    week[ref.path] = dict(data)
+
+def _cached(ref) -> Optional[Dict]:
+    for week in list(_WRITTEN.values()):
+        hit = week.get(ref.path)
+        if hit is not None:
+            return hit
+    return None
+
+def _read(ref, source: str = "server") -> Optional[Dict]:
+    if source == "cache":
+        hit = _cached(ref)
+        if hit is not None:
+            return dict(hit)
+    s = ref.get()
+    return s.to_dict() if s.exists else None
+
+def _read_many(db, refs, source: str = "server") -> Dict[str, Optional[Dict]]:
+    """_read for many refs, keyed by ref.path: cache hits first, the rest in one get_all round-trip."""
+    out: Dict[str, Optional[Dict]] = {}
+    missing = []
+    for ref in refs:
+        hit = _cached(ref) if source == "cache" else None
+        if hit is not None:
+            out[ref.path] = dict(hit)
+        else:
+            missing.append(ref)
+    if missing:
+        for s in db.get_all(missing):
+            out[s.reference.path] = s.to_dict() if s.exists else None
+    return out
+
+def _read_plans(db, pids: List[str], week_id: str, kind: str, source: str) -> Dict[str, Optional[Dict]]:
+    refs = [_plan_ref(db, "Experiment_ACEGPT", pid, week_id, kind) for pid in pids]
+    by_path = _read_many(db, refs, source)
+    return {pid: by_path.get(ref.path) for pid, ref in zip(pids, refs)}
+
+# personas/{pid} and workouts/{wid} do not change during a run: read-aside cache keyed by
+# path (None = doc missing). Diet/updated_persona docs go through _WRITTEN instead.
+_STATIC: Dict[str, Optional[Dict]] = {}
+
+def _static_copy(path: str) -> Optional[Dict]:
+    hit = _STATIC[path]
+    return dict(hit) if hit is not None else None
+
+def _read_static(ref) -> Optional[Dict]:
+    if ref.path not in _STATIC:
+        s = ref.get()
+        _STATIC[ref.path] = s.to_dict() if s.exists else None
+    return _static_copy(ref.path)
+
+def _read_static_many(db, refs) -> Dict[str, Optional[Dict]]:
+    """_read_static for many refs, keyed by ref.path: misses fetched in one get_all round-trip."""
+    missing = [ref for ref in refs if ref.path not in _STATIC]
+    if missing:
+        for s in db.get_all(missing):
+            _STATIC[s.reference.path] = s.to_dict() if s.exists else None
+    return {ref.path: _static_copy(ref.path) for ref in refs}
+
+def _write(ref, week_id: str, data: Dict):
+    ref.set(data)
+    _remember(week_id, ref, data)
+
+@lru_cache(maxsize=2048)
+def _week_ref(db, experiment: str, pid: str, week_id: str):
+    # memoized: diet/logs/updated_persona refs of a persona-week branch off one shared parent
+    return (db.collection("experiments").document(experiment)
+              .collection("users").document(pid)
+              .collection("weeks").document(week_id))
+
+def _plan_ref(db, experiment: str, pid: str, week_id: str, kind: str):
+    return _week_ref(db, experiment, pid, week_id).collection(kind).document("plan")
+
+_DB_LOCK = threading.Lock()
+
+def _warm(db: firestore.Client) -> None:
+    # one keys-only read opens the gRPC channel and fetches the auth token up front,
+    # so the first real read of the run does not pay for it
+    try:
+        next(iter(db.collection("personas").select([]).limit(1).stream()), None)
+    except Exception as e:
+        print(f"[WARN] Firestore warm-up read failed: {e}")
+
+@lru_cache(maxsize=1)
+def _client() -> firestore.Client:
+    # one client (credentials + gRPC channel) per process; the client is thread-safe
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
-    return firestore.Client(project=PROJECT_ID, credentials=creds)
+    db = firestore.Client(project=PROJECT_ID, credentials=creds)
+    _warm(db)
+    return db
+
+def get_db() -> firestore.Client:
+    # lock: concurrent first calls must not each build a client
+    with _DB_LOCK:
+        return _client()
+
+def iter_persona_ids(db, page_size: int = 500) -> Iterator[str]:
+    """Persona ids in document-id order, fetched keys-only in pages of page_size; stop iterating to stop reading."""
+    query = db.collection("personas").select([]).order_by(FieldPath.document_id()).limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        for d in page:
+            yield d.id
+        if len(page) < page_size:
+            return
+        last = page[-1]
 
 def list_persona_ids(db) -> List[str]:
-    docs = db.collection("personas").stream()
-    return sorted([d.id for d in docs])
+    # pages already arrive sorted by id, so no sort here
+    return list(iter_persona_ids(db))
 
 def read_persona_base(db, pid: str) -> Dict:
-    snap = db.collection("personas").document(pid).get()
-    d = snap.to_dict() or {}
+    d = _read_static(db.collection("personas").document(pid)) or {}
     d["ID"] = pid
     return d
 
-def read_updated_persona(db, pid: str, week_id: str) -> Optional[Dict]:
-    ref = (db.collection("experiments").document("Experiment_ACEGPT")
-           .collection("users").document(pid)
-           .collection("weeks").document(week_id)
-           .collection("updated_persona").document("plan"))
-    s = ref.get()
-    return s.to_dict() if s.exists else None
+def read_personas_base_bulk(db, pids: List[str]) -> Dict[str, Dict]:
+    """read_persona_base for many pids: cached personas plus one get_all for the rest."""
+    refs = [db.collection("personas").document(pid) for pid in pids]
+    by_path = _read_static_many(db, refs)
+    return {pid: {**(by_path[ref.path] or {}), "ID": pid} for pid, ref in zip(pids, refs)}
 
-def read_diet(db, pid: str, week_id: str) -> Optional[Dict]:
-    ref = (db.collection("experiments").document("Experiment_ACEGPT")
-           .collection("users").document(pid)
-           .collection("weeks").document(week_id)
-           .collection("diet").document("plan"))
-    s = ref.get()
-    return s.to_dict() if s.exists else None
+def read_updated_persona(db, pid: str, week_id: str, source: str = "server") -> Optional[Dict]:
+    return _read(_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "updated_persona"), source)
+
+def read_updated_personas_bulk(db, pids: List[str], week_id: str, source: str = "server") -> Dict[str, Optional[Dict]]:
+    """read_updated_persona for many pids: cache hits plus one get_all for the rest."""
+    return _read_plans(db, pids, week_id, "updated_persona", source)
+
+def read_diet(db, pid: str, week_id: str, source: str = "server") -> Optional[Dict]:
+    return _read(_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "diet"), source)
+
+def read_diets_bulk(db, pids: List[str], week_id: str, source: str = "server") -> Dict[str, Optional[Dict]]:
+    """read_diet for many pids: cache hits plus one get_all for the rest."""
+    return _read_plans(db, pids, week_id, "diet", source)
 
 def write_diet(db, pid: str, week_id: str, diet: Dict):
-    (db.collection("experiments").document("Experiment_ACEGPT")
-       .collection("users").document(pid)
-       .collection("weeks").document(week_id)
-       .collection("diet").document("plan")).set(diet)
+    _write(_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "diet"), week_id, diet)
 
 def write_logs(db, experiment: str, pid: str, week_id: str, data: Dict):
-    (db.collection("experiments").document(experiment)
-       .collection("users").document(pid)
-       .collection("weeks").document(week_id)
-       .collection("logs").document("plan")).set(data)
+    _plan_ref(db, experiment, pid, week_id, "logs").set(data)
 
 def write_updated_persona(db, experiment: str, pid: str, week_id: str, data: Dict):
-    (db.collection("experiments").document(experiment)
-       .collection("users").document(pid)
-       .collection("weeks").document(week_id)
-       .collection("updated_persona").document("plan")).set(data)
+    _write(_plan_ref(db, experiment, pid, week_id, "updated_persona"), week_id, data)
+
+def write_persona_bundle(db, pid: str, week_id: str, diet: Dict, logs: Dict, up: Dict):
+    """Diet + logs + updated_persona (both experiments) for one persona-week in one batch commit."""
+    docs = [
+        (_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "diet"), diet),
+        (_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "updated_persona"), up),
+        (_plan_ref(db, "Experiment_OpenAI", pid, week_id, "updated_persona"), up),
+    ]
+    batch = db.batch()
+    batch.set(_plan_ref(db, "Experiment_ACEGPT", pid, week_id, "logs"), logs)  # never read back: not cached
+    for ref, data in docs:
+        batch.set(ref, data)
+    batch.commit()
+    for ref, data in docs:
+        _remember(week_id, ref, data)
 
 def read_workout(db, wid: str) -> Optional[Dict]:
-    s = db.collection("workouts").document(wid).get()
-    return s.to_dict() if s.exists else None
+    return _read_static(db.collection("workouts").document(wid))
+
+def read_workouts_bulk(db, wids: List[str]) -> Dict[str, Optional[Dict]]:
+    """read_workout for many workout ids: cached workouts plus one get_all for the rest."""
+    refs = [db.collection("workouts").document(wid) for wid in wids]
+    by_path = _read_static_many(db, refs)
+    return {wid: by_path[ref.path] for wid, ref in zip(wids, refs)}
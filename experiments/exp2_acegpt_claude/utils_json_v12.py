@@ -1,6 +1,7 @@
 # utils_json_v12.py
-import json, hashlib, random, math
-from typing import Dict, Any, List, Optional
+import json, hashlib, math
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 
 SAUDI_MEAL_NAMES = [
     "Masoub (banana+dates+milk)",
@@ -18,27 +19,60 @@ SAUDI_MEAL_NAMES = [
     "Date + laban snack",
 ]
 
+MEALS      = ("1st", "2nd", "3rd", "4th")
+MKEYS      = ("kcal_target_kcal", "carbs_g", "fat_g", "protein_g", "fiber_g", "sodium_mg")
+TOTAL_KEYS = ("Total_kcal_target_kcal", "Total_carbs_g", "Total_fat_g",
+              "Total_protein_g", "Total_fiber_g", "Total_sodium_mg")  # aligned with MKEYS
+MEAL_NAME_KEYS = tuple(f"{m}_meal" for m in MEALS)
+FULL_KEYS      = tuple((m, mk, f"{m}_meal_{mk}") for m in MEALS for mk in MKEYS)
+KEYS_BY_METRIC = {mk: tuple(full for _, k, full in FULL_KEYS if k == mk) for mk in MKEYS}
+
+DIVERSIFY_MAX_TRIES = 8
+# uniforms drawn per diversify attempt: 5 for totals, 1 for the meal-name offset, 6x4 for the splits
+_N_SCALAR_DRAWS = 6
+_N_DRAWS        = _N_SCALAR_DRAWS + len(MKEYS) * len(MEALS)
+
 def _f(v, default=0.0) -> float:
+    # exact-type fast paths first: almost every value here is already a float
+    t = type(v)
+    if t is float: return v
+    if t is int: return float(v)
+    if v is None: return float(default)
     try:
-        if v is None: return float(default)
-        if isinstance(v, str) and v.strip()=="":
-            return float(default)
-        return float(v)
+        return float(v)   # blank/whitespace strings raise -> default
     except Exception:
         return float(default)
 
+def _first_balanced_json(s: str) -> Optional[str]:
+    # single pass from the first '{': track depth and skip braces inside JSON strings.
+    start = s.find("{")
+    if start == -1: return None
+    depth, in_str, esc = 0, False, False
+    for i in range(start, len(s)):
+        c = s[i]
+        if in_str:
+            if esc: esc = False
+            elif c == "\\": esc = True
+            elif c == '"': in_str = False
+        elif c == '"': in_str = True
+        elif c == "{": depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0: return s[start:i+1]
+    return None
+
 def extract_first_json(text: str) -> Dict[str, Any]:
     if not text: raise ValueError("Empty response")
+    block = None
     if "```" in text:
-        parts = text.split("```")
-        candidates = [c for c in parts if "{" in c and "}" in c]
-        if candidates:
-            s = candidates[0]
-            s2 = s[s.find("{"):s.rfind("}")+1]
-            return json.loads(s2)
-    s, e = text.find("{"), text.rfind("}")
-    if s == -1 or e == -1 or e <= s: raise ValueError("No JSON object found")
-    return json.loads(text[s:e+1])
+        # prefer the fenced block: prose before it may carry its own {...}
+        fenced = next((c for c in text.split("```")[1::2] if "{" in c and "}" in c), None)
+        if fenced is not None:
+            block = _first_balanced_json(fenced)
+    if block is None:
+        block = _first_balanced_json(text)
+    if block is None: raise ValueError("No JSON object found")
+    return json.loads(block)
 
 def _ensure_meal_label(val, idx):
     if isinstance(val, str) and val.strip():
@@ -54,117 +88,89 @@ def _pull_nested_meal_num(obj: Dict[str, Any], key: str, fallback=0.0):
     return float(fallback)
 
 def ensure_diet_shape(obj: Dict[str, Any]) -> Dict[str, Any]:
-    totals = ["Total_kcal_target_kcal","Total_carbs_g","Total_fat_g",
-              "Total_protein_g","Total_fiber_g","Total_sodium_mg"]
-    meals  = ["1st","2nd","3rd","4th"]
-    mkeys  = ["kcal_target_kcal","carbs_g","fat_g","protein_g","fiber_g","sodium_mg"]
-
-    for k in totals:
+    for k in TOTAL_KEYS:
         obj[k] = _f(obj.get(k, 0.0), 0.0)
 
-    for i, m in enumerate(meals):
-        name_key = f"{m}_meal"
+    for i, name_key in enumerate(MEAL_NAME_KEYS):
         obj[name_key] = _ensure_meal_label(obj.get(name_key), i)
-        for mk in mkeys:
-            full = f"{m}_meal_{mk}"
-            obj[full] = _pull_nested_meal_num(obj, full, 0.0)
+    for _, _, full in FULL_KEYS:
+        obj[full] = _pull_nested_meal_num(obj, full, 0.0)
 
     # if totals missing, recompute from meals
-    def _sum(mm): return float(sum(obj[f"{m}_meal_{mm}"] for m in meals))
-    if obj["Total_kcal_target_kcal"]==0.0:
-        obj["Total_kcal_target_kcal"] = _sum("kcal_target_kcal")
-    if obj["Total_carbs_g"]==0.0:
-        obj["Total_carbs_g"] = _sum("carbs_g")
-    if obj["Total_fat_g"]==0.0:
-        obj["Total_fat_g"] = _sum("fat_g")
-    if obj["Total_protein_g"]==0.0:
-        obj["Total_protein_g"] = _sum("protein_g")
-    if obj["Total_fiber_g"]==0.0:
-        obj["Total_fiber_g"] = _sum("fiber_g")
-    if obj["Total_sodium_mg"]==0.0:
-        obj["Total_sodium_mg"] = _sum("sodium_mg")
+    for mk, tk in zip(MKEYS, TOTAL_KEYS):
+        if obj[tk]==0.0:
+            obj[tk] = float(sum(obj[k] for k in KEYS_BY_METRIC[mk]))
 
     if not obj.get("Note"):
         obj["Note"] = "Saudi-inspired plan. Adjust portions if training load changes."
 
     return obj
 
-def _sha_seed(s: str) -> int:
-    return int(hashlib.sha256(s.encode("utf-8")).hexdigest()[:12], 16)
+def _hash_seed(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=6).digest(), "big")
 
-def _dirichlet4(rnd: random.Random) -> List[float]:
-    xs = [rnd.random() + 0.3 for _ in range(4)]
-    s  = sum(xs)
-    return [x/s for x in xs]
-
-def _split(total: float, rnd: random.Random) -> List[float]:
-    if total <= 0: return [0.0,0.0,0.0,0.0]
-    w = _dirichlet4(rnd)
-    return [round(total*wi, 1) for wi in w]
+def _split_batch(totals: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """Split each total across 4 meals with (u+0.3)-normalized weights (u: (len(totals), 4) uniforms); totals <= 0 give zeros."""
+    x = u + 0.3
+    w = x / x.sum(axis=1, keepdims=True)
+    return np.round(np.clip(totals, 0.0, None)[:, None] * w, 1)
 
 def _all_meals_identical(obj: Dict[str, Any], tol=1e-6) -> bool:
-    meals = ["1st","2nd","3rd","4th"]
-    keys  = ["kcal_target_kcal","carbs_g","fat_g","protein_g","fiber_g","sodium_mg"]
-    first = {k: obj[f"1st_meal_{k}"] for k in keys}
-    for m in meals[1:]:
-        for k in keys:
-            if abs(_f(obj[f"{m}_meal_{k}"]) - _f(first[k])) > tol:
-                return False
+    for keys in KEYS_BY_METRIC.values():
+        v0 = _f(obj[keys[0]])
+        if any(abs(_f(obj[k]) - v0) > tol for k in keys[1:]):
+            return False
     # also check identical meal names
-    n0 = str(obj.get("1st_meal",""))
-    if any(str(obj.get(f"{m}_meal","")) != n0 for m in meals[1:]):
+    n0 = str(obj.get(MEAL_NAME_KEYS[0],""))
+    if any(str(obj.get(k,"")) != n0 for k in MEAL_NAME_KEYS[1:]):
         return False
     return True
 
 def _similar_overview(a: Dict[str, Any], b: Optional[Dict[str, Any]], tol=1e-6) -> bool:
     if not b: return False
     # same meal names OR nearly equal totals implies similar overview
-    same_names = all(str(a.get(f"{m}_meal","")) == str(b.get(f"{m}_meal","")) for m in ["1st","2nd","3rd","4th"])
-    close_totals = all(abs(_f(a.get(k,0)) - _f(b.get(k,0))) <= tol for k in [
-        "Total_kcal_target_kcal","Total_carbs_g","Total_fat_g","Total_protein_g","Total_fiber_g","Total_sodium_mg"
-    ])
-    return same_names or close_totals
-
-def _goal_kcal(w_kg: float, goal: str) -> float:
+    if all(str(a.get(k,"")) == str(b.get(k,"")) for k in MEAL_NAME_KEYS):
+        return True
+    return all(abs(_f(a.get(k,0)) - _f(b.get(k,0))) <= tol for k in TOTAL_KEYS)
+
+# goal flags (a goal can mention both); muscle takes precedence for macro params
+GOAL_FAT, GOAL_MUSCLE = 1, 2
+# flag -> (protein g/kg, protein floor g, protein cap g, fat share of kcal)
+_MACRO_PARAMS = {
+    GOAL_MUSCLE: (1.9, 110, 190, 0.27),
+    GOAL_FAT:    (1.8, 100, 180, 0.30),
+    0:           (1.7,  95, 175, 0.28),
+}
+
+def _goal_code(goal: Optional[str]) -> int:
+    g = (goal or "").lower()
+    return (GOAL_FAT if "fat" in g else 0) | (GOAL_MUSCLE if "muscle" in g else 0)
+
+def _goal_kcal(w_kg: float, goal_code: int) -> float:
     base = 28.0*w_kg
-    if "fat" in goal: base -= 250
-    if "muscle" in goal: base += 150
+    if goal_code & GOAL_FAT: base -= 250
+    if goal_code & GOAL_MUSCLE: base += 150
     return max(1600.0, min(3600.0, base))
 
-def _jitter(value: float, pct: float, rnd: random.Random) -> float:
-    lo = 1.0 - pct
-    hi = 1.0 + pct
-    return round(value * rnd.uniform(lo, hi), 1)
+def _jitter(value: float, pct: float, u: float) -> float:
+    # u in [0, 1) -> factor in [1-pct, 1+pct)
+    return round(value * (1.0 - pct + 2.0*pct*u), 1)
 
-def _re_totals_with_jitter(obj: Dict[str, Any], persona: Dict[str, Any], rnd: random.Random):
-    # Base on goal & weight; add small jitter to guarantee week/persona variety
-    w = _f(persona.get("Weight_kg"), 75.0)
-    goal = (persona.get("Primary_goal") or "").lower()
-    kcal = _goal_kcal(w, goal)
-    kcal = _jitter(kcal, 0.06, rnd)  # ±6% per persona-week
+def _totals_kernel(w: float, goal_code: int, u: List[float]) -> Tuple[float, ...]:
+    """Numeric core of the totals from 5 uniforms: returns values in TOTAL_KEYS order (kcal, carbs, fat, protein, fiber, sodium)."""
+    kcal = _jitter(_goal_kcal(w, goal_code), 0.06, u[0])  # ±6% per persona-week
 
     # macro ratios varied by goal + jitter
-    if "muscle" in goal:
-        p = _jitter(min(max(1.9*w, 110), 190), 0.06, rnd)
-        f = _jitter(kcal*0.27/9.0, 0.08, rnd)
-    elif "fat" in goal:
-        p = _jitter(min(max(1.8*w, 100), 180), 0.06, rnd)
-        f = _jitter(kcal*0.30/9.0, 0.08, rnd)
-    else:
-        p = _jitter(min(max(1.7*w, 95), 175), 0.06, rnd)
-        f = _jitter(kcal*0.28/9.0, 0.08, rnd)
+    pkg, p_lo, p_hi, fat_share = _MACRO_PARAMS[GOAL_MUSCLE if goal_code & GOAL_MUSCLE else goal_code]
+    p = _jitter(min(max(pkg*w, p_lo), p_hi), 0.06, u[1])
+    f = _jitter(kcal*fat_share/9.0, 0.08, u[2])
     c = max(90.0, (kcal - (p*4 + f*9)) / 4.0)
 
-    # fiber target & sodium target with persona-week jitter
-    fiber   = round(rnd.uniform(24, 36), 1)
-    sodium  = round(max(1500.0, min(3200.0, 2000.0 + (w-70.0)*8.0 + rnd.uniform(-350, 350))), 0)
+    # fiber target (24..36 g) & sodium target (±350 mg) with persona-week jitter
+    fiber   = round(24.0 + 12.0*u[3], 1)
+    sodium  = round(max(1500.0, min(3200.0, 2000.0 + (w-70.0)*8.0 - 350.0 + 700.0*u[4])), 0)
 
-    obj["Total_kcal_target_kcal"] = round(kcal, 1)
-    obj["Total_carbs_g"]          = round(c, 1)
-    obj["Total_fat_g"]            = round(f, 1)
-    obj["Total_protein_g"]        = round(p, 1)
-    obj["Total_fiber_g"]          = float(fiber)
-    obj["Total_sodium_mg"]        = float(sodium)
+    return round(kcal, 1), round(c, 1), round(f, 1), round(p, 1), float(fiber), float(sodium)
 
 def make_diet_fingerprint(obj: Dict[str, Any]) -> str:
     # A short signature to detect duplicates within the same week run
@@ -174,7 +180,7 @@ def make_diet_fingerprint(obj: Dict[str, Any]) -> str:
         f"{round(_f(obj.get('Total_kcal_target_kcal')), -1)}|"
         f"{round(_f(obj.get('Total_sodium_mg')), -1)}"
     )
-    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
 
 def diversify_meals(
     obj: Dict[str, Any],
@@ -189,39 +195,32 @@ def diversify_meals(
     - Always apply persona-week seeded jitter to totals (so Total_sodium_mg not identical).
     - Re-split macros & sodium across meals.
     - Rotate meal names.
-    - If still too similar to last week, push another rotation.
+    - If still too similar to last week, push another rotation (at most DIVERSIFY_MAX_TRIES).
     """
-    seed = _sha_seed(f"{pid}|{week_id}|diet|{nonce}")
-    rnd  = random.Random(seed)
-
-    # 1) Replace totals with goal/weight-informed values + jitter (guarantee cross-person/week differences)
-    _re_totals_with_jitter(obj, persona, rnd)
-
-    # 2) Assign meal names (rotating window)
-    offset = rnd.randrange(0, len(SAUDI_MEAL_NAMES) - 4)
-    chosen = [SAUDI_MEAL_NAMES[offset + i] for i in range(4)]
-    for idx, tag in enumerate(["1st","2nd","3rd","4th"]):
-        obj[f"{tag}_meal"] = chosen[idx]
-
-    # 3) Re-split totals across meals with Dirichlet weights
-    splits = {
-        "kcal_target_kcal": _split(obj["Total_kcal_target_kcal"], rnd),
-        "carbs_g":          _split(obj["Total_carbs_g"], rnd),
-        "fat_g":            _split(obj["Total_fat_g"], rnd),
-        "protein_g":        _split(obj["Total_protein_g"], rnd),
-        "fiber_g":          _split(obj["Total_fiber_g"], rnd),
-        "sodium_mg":        _split(obj["Total_sodium_mg"], rnd),
-    }
-    for i, tag in enumerate(["1st","2nd","3rd","4th"]):
-        obj[f"{tag}_meal_kcal_target_kcal"] = splits["kcal_target_kcal"][i]
-        obj[f"{tag}_meal_carbs_g"]          = splits["carbs_g"][i]
-        obj[f"{tag}_meal_fat_g"]            = splits["fat_g"][i]
-        obj[f"{tag}_meal_protein_g"]        = splits["protein_g"][i]
-        obj[f"{tag}_meal_fiber_g"]          = splits["fiber_g"][i]
-        obj[f"{tag}_meal_sodium_mg"]        = splits["sodium_mg"][i]
-
-    # 4) If Ace output had identical meals or is too similar to last week, apply an extra rotation
-    if _all_meals_identical(obj) or _similar_overview(obj, last_week_obj):
-        return diversify_meals(obj, pid, week_id, persona, last_week_obj, nonce=nonce+1)
+    w = _f(persona.get("Weight_kg"), 75.0)
+    goal_code = _goal_code(persona.get("Primary_goal"))
+
+    for n in range(nonce, nonce + DIVERSIFY_MAX_TRIES):
+        # one PCG64 draw per attempt; consumed below by position
+        draws = np.random.default_rng(_hash_seed(f"{pid}|{week_id}|diet|{n}")).random(_N_DRAWS)
+        u = draws[:_N_SCALAR_DRAWS].tolist()
+
+        # 1) Replace totals with goal/weight-informed values + jitter (guarantee cross-person/week differences)
+        obj.update(zip(TOTAL_KEYS, _totals_kernel(w, goal_code, u)))
+
+        # 2) Assign meal names (rotating window)
+        offset = int(u[5] * (len(SAUDI_MEAL_NAMES) - 4))
+        chosen = SAUDI_MEAL_NAMES[offset:offset + 4]
+        obj.update(zip(MEAL_NAME_KEYS, chosen))
+
+        # 3) Re-split all six totals across meals in one vectorized pass
+        totals = np.array([obj[k] for k in TOTAL_KEYS], dtype=float)
+        parts  = _split_batch(totals, draws[_N_SCALAR_DRAWS:].reshape(len(MKEYS), len(MEALS))).tolist()
+        for mk, row in zip(MKEYS, parts):
+            obj.update(zip(KEYS_BY_METRIC[mk], row))
+
+        # 4) If Ace output had identical meals or is too similar to last week, apply an extra rotation
+        if not (_all_meals_identical(obj) or _similar_overview(obj, last_week_obj)):
+            break
 
     return obj
@@ -0,0 +1,21 @@
+# utils_persona.py
+from typing import Dict
+
+# persona attributes carried over unchanged week to week
+_PERSONA_KEYS = (
+    "Age_band", "Sex", "BMI", "Days_per_week", "Current_fitness_level", "Primary_goal",
+    "Adherence_propensity", "Cooking_skill", "Budjet_SAR_per_day",
+)
+# (updated_persona field, logs field) taken from this week's simulated logs
+_LOG_FIELD_MAP = (
+    ("Weight_kg", "Post_weight_kg"),
+    ("Muscle_mass_kg", "Post_muscle_kg"),
+    ("Fat_percent", "Post_fat_pct"),
+    ("Sleep_hours", "sleep_avg_hours"),
+    ("notes", "notes"),   # week-specific notes (already persona+week unique)
+)
+
+def build_updated_persona(persona: Dict, logs: Dict) -> Dict:
+    out = {k: persona.get(k) for k in _PERSONA_KEYS}
+    out.update((dst, logs.get(src)) for dst, src in _LOG_FIELD_MAP)
+    return out
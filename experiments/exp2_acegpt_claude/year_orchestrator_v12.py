@@ -1,14 +1,16 @@
 # year_orchestrator_v12.py
-import datetime
-from typing import Dict, Set
-from config_year_v12 import START_WEEK_ID, TOTAL_WEEKS, INCLUDE_START_WEEK, WORKOUT_MAP
+import datetime, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple
+from config_year_v12 import START_WEEK_ID, TOTAL_WEEKS, INCLUDE_START_WEEK, WORKOUT_MAP, MAX_WORKERS
 from firestore_io_year_v11 import (
-    get_db, list_persona_ids, read_persona_base, read_updated_persona,
-    read_diet, write_diet, write_logs, write_updated_persona, read_workout
+    get_db, list_persona_ids, read_personas_base_bulk, read_updated_personas_bulk,
+    read_diets_bulk, write_persona_bundle, read_workout, read_workouts_bulk
 )
 from acegpt_client_v12 import get_diet_from_ace
 from claude_client_v12 import simulate_week_with_claude
 from utils_json_v12 import make_diet_fingerprint
+from utils_persona import build_updated_persona
 
 def _week_to_monday(week_id: str) -> datetime.date:
     _, yyyy, ww = week_id.split("_")
@@ -30,97 +32,105 @@ def week_sequence(start_week_id: str, n: int, include_start: bool) -> list[str]:
 def _choose_workouts(days_per_week: int):
     return WORKOUT_MAP.get(int(days_per_week), WORKOUT_MAP[3])
 
-def build_updated_persona(prev: Dict, logs: Dict) -> Dict:
-    return {
-        "Age_band": prev.get("Age_band"),
-        "Sex": prev.get("Sex"),
-        "BMI": prev.get("BMI"),
-        "Days_per_week": prev.get("Days_per_week"),
-        "Current_fitness_level": prev.get("Current_fitness_level"),
-        "Primary_goal": prev.get("Primary_goal"),
-        "Adherence_propensity": prev.get("Adherence_propensity"),
-        "Cooking_skill": prev.get("Cooking_skill"),
-        "Budjet_SAR_per_day": prev.get("Budjet_SAR_per_day"),
-        "Weight_kg": logs.get("Post_weight_kg"),
-        "Muscle_mass_kg": logs.get("Post_muscle_kg"),
-        "Fat_percent": logs.get("Post_fat_pct"),
-        "Sleep_hours": logs.get("sleep_avg_hours"),
-        # copy week-specific notes (already persona+week unique)
-        "notes": logs.get("notes"),
-    }
+def _persona_workouts(persona: Dict):
+    return _choose_workouts(int(persona.get("Days_per_week", 3) or 3))
+
+def _claim(sig: str, used: Set[str], lock: threading.Lock) -> bool:
+    """Atomically reserve a fingerprint for this week; False if another persona already has it."""
+    with lock:
+        if sig in used:
+            return False
+        used.add(sig)
+        return True
+
+def process_persona(db, pid: str, w: str, persona_src: Dict, last_diet: Optional[Dict],
+                    get_workout: Callable[[str], Dict],
+                    used_diet_fps: Set[str], used_text_fps: Set[str],
+                    lock: threading.Lock) -> Tuple[str, str, str, Dict, Dict]:
+    print(f"[INFO] Week {w} -> {pid}")
+
+    # persona source for this week (prev week's updated_persona, else base) and last week's diet
+    # are prefetched for the whole week by main()
+    persona_src["ID"] = pid
+
+    # --- 1) Diet with forced diversification & cross-person uniqueness in SAME week ---
+    attempt = 0
+    while True:
+        diet = get_diet_from_ace(persona_src, pid, w, last_week_diet=last_diet, diversify_nonce=attempt)
+        fp   = make_diet_fingerprint(diet)
+        if _claim(fp, used_diet_fps, lock):
+            break
+        attempt += 1
+        if attempt > 3:
+            # accept and move on (already varied by nonce)
+            break
+
+    # --- 2) Workouts for the week ---
+    wids = _persona_workouts(persona_src)
+
+    # --- 3) Logs with uniqueness guard (notes + free_text_feedback) ---
+    attempt = 0
+    while True:
+        logs = simulate_week_with_claude(persona_src, diet, get_workout, wids, pid, w, nonce=attempt)
+        # create a small fingerprint of texts to avoid identical outputs across personas within the same week
+        text_sig = hashlib.blake2b(
+            (logs.get("free_text_feedback","") + "|" + logs.get("notes","")).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        if _claim(text_sig, used_text_fps, lock):
+            break
+        attempt += 1
+        if attempt > 3:
+            break
+
+    # --- 4) Updated persona into both experiments (notes already persona+week unique) ---
+    up = build_updated_persona(persona_src, logs)
+
+    # --- 5) Persist diet, logs and both updated personas in one commit ---
+    write_persona_bundle(db, pid, w, diet, logs, up)
+    print(f"[OK] diet/logs/updated_persona saved @ {w} for {pid}")
+    return pid, fp, text_sig, logs, up
 
 def main():
     db   = get_db()
     pids = list_persona_ids(db)
     print(f"[INFO] Personas: {pids}")
 
-    # load workouts
-    all_wids = {wid for arr in WORKOUT_MAP.values() for wid in arr}
-    workouts_map = {wid: (read_workout(db, wid) or {}) for wid in all_wids}
+    # workouts are fetched on first use and cached for the run (read_workout keeps them);
+    # each week prefetches only the ids its personas get, see below
+    def get_workout(wid: str) -> Dict:
+        return read_workout(db, wid) or {}
 
     weeks = week_sequence(START_WEEK_ID, TOTAL_WEEKS, INCLUDE_START_WEEK)
 
-    for w in weeks:
+    for idx, w in enumerate(weeks):
         print(f"\n================= {w} =================")
-        idx  = weeks.index(w)
         prev = START_WEEK_ID if idx == 0 else weeks[idx-1]
 
         # per-week de-dup guards (avoid same diet across different personas in this week)
         used_diet_fps: Set[str] = set()
         used_text_fps: Set[str] = set()
-
-        for pid in pids:
-            print(f"[INFO] Week {w} -> {pid}")
-
-            # persona source for this week (carry over from prev week if exists)
-            persona_src = read_updated_persona(db, pid, prev) or read_persona_base(db, pid)
-            persona_src["ID"] = pid
-
-            # last week diet (for similarity check)
-            last_diet = read_diet(db, pid, prev)
-
-            # --- 1) Diet with forced diversification & cross-person uniqueness in SAME week ---
-            attempt = 0
-            while True:
-                diet = get_diet_from_ace(persona_src, pid, w, last_week_diet=last_diet, diversify_nonce=attempt)
-                fp   = make_diet_fingerprint(diet)
-                if fp not in used_diet_fps:
-                    used_diet_fps.add(fp)
-                    break
-                attempt += 1
-                if attempt > 3:
-                    # accept and move on (already varied by nonce)
-                    break
-            write_diet(db, pid, w, diet)
-            print(f"[OK] diet saved @ {w} for {pid}")
-
-            # --- 2) Workouts for the week ---
-            days = int(persona_src.get("Days_per_week", 3) or 3)
-            wids = _choose_workouts(days)
-
-            # --- 3) Logs with uniqueness guard (notes + free_text_feedback) ---
-            attempt = 0
-            while True:
-                logs = simulate_week_with_claude(persona_src, diet, workouts_map, wids, pid, w, nonce=attempt)
-                # create a small fingerprint of texts to avoid identical outputs across personas within the same week
-                text_sig = hashlib.sha1(
-                    (logs.get("free_text_feedback","") + "|" + logs.get("notes","")).encode("utf-8")
-                ).hexdigest()[:16]
-                if text_sig not in used_text_fps:
-                    used_text_fps.add(text_sig)
-                    break
-                attempt += 1
-                if attempt > 3:
-                    break
-            write_logs(db, "Experiment_ACEGPT", pid, w, logs)
-            print(f"[OK] logs saved @ {w} for {pid}")
-
-            # --- 4) Updated persona into both experiments (notes already persona+week unique) ---
-            up = build_updated_persona(persona_src, logs)
-            write_updated_persona(db, "Experiment_ACEGPT", pid, w, up)
-            write_updated_persona(db, "Experiment_OpenAI", pid, w, up)
-            print(f"[OK] updated_persona saved @ {w} for {pid}")
+        lock = threading.Lock()  # guards both sets across persona workers
+        # from the 2nd week on, prev-week docs were written by this run
+        source = "cache" if idx > 0 else "server"
+
+        # prev-week personas and diets for everyone: cache hits plus one get_all each
+        prev_personas = read_updated_personas_bulk(db, pids, prev, source=source)
+        last_diets = read_diets_bulk(db, pids, prev, source=source)
+        missing = [pid for pid in pids if not prev_personas.get(pid)]
+        base_personas = read_personas_base_bulk(db, missing) if missing else {}
+        sources = {pid: prev_personas.get(pid) or base_personas.get(pid) or {"ID": pid} for pid in pids}
+
+        # workouts this week's personas get and the run has not read yet: one get_all
+        read_workouts_bulk(db, sorted({wid for src in sources.values() for wid in _persona_workouts(src)}))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(pids)))) as ex:
+            futures = [
+                ex.submit(process_persona, db, pid, w, sources[pid],
+                          last_diets.get(pid), get_workout, used_diet_fps, used_text_fps, lock)
+                for pid in pids
+            ]
+            for fut in futures:
+                fut.result()
 
 if __name__ == "__main__":
-    import hashlib
     main()
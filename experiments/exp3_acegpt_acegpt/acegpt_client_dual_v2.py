@@ -1,27 +1,34 @@
 ﻿# --- acegpt_client_dual_v2.py ---
 from __future__ import annotations
-import os, json, hashlib, random, math
-from typing import Dict, Any
+import os, json, hashlib, random, math, re, shelve, threading, time, logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Any, List
 import requests
-from tenacity import retry, stop_after_attempt, wait_exponential
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential
 
 from config_dual import (
     HF_COMPLETIONS_URL, HF_CHAT_URL,
     ACE_MODEL, ACE_PROVIDER,
     ACE_MAX_TOKENS, ACE_TEMPERATURE, ACE_TOP_P,
-    DEFAULT_STOP, hf_headers
+    DEFAULT_STOP, hf_headers, ACE_CACHE_FILE, ACE_CONCURRENCY, ACE_MAX_RPM,
+    ACE_SIM_MAX_TOKENS, ACE_SIM_STOP
 )
 
-# ---------- helpers ----------
-def _variety_key(pid: str, week_id: str) -> str:
-    base = f"{pid}:{week_id}:v3"
-    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+log = logging.getLogger(__name__)
+
+_KCAL_LINE = re.compile(r"kcal|calorie", re.I)
+_KCAL_NUM  = re.compile(r"(\d{3,4})")
 
-def _rng_from_key(key: str) -> random.Random:
-    return random.Random(int(key[:16], 16))
+# ---------- helpers ----------
+@lru_cache(maxsize=4096)
+def _seed_from_key(key: str) -> int:
+    """First 64 bits of sha256(key) as an int (same seed as the old hex round-trip)."""
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
 
-def _pick(rng: random.Random, choices):
-    return choices[rng.randrange(len(choices))]
+def _variety_seed(pid: str, week_id: str) -> int:
+    return _seed_from_key(f"{pid}:{week_id}:v3")
 
 def _jitter(rng: random.Random, value: float, pct: float = 0.1, min_val: float | None = None) -> float:
     """±pct jitter"""
@@ -30,13 +37,23 @@ def _jitter(rng: random.Random, value: float, pct: float = 0.1, min_val: float |
         v = max(min_val, v)
     return v
 
+def _looks_like_diet(out: str) -> bool:
+    """Very light check: does the text mention any meal at all?"""
+    lower = out.lower()
+    return any(k in lower for k in ["breakfast", "meal 1", "lunch", "dinner"])
+
 # ---------- diverse fallback plan ----------
 def _fallback_saudi_plan(pid: str, week_id: str) -> Dict[str, Any]:
+    # callers may add/pop keys, so hand out a copy of the memoized plan
+    return dict(_fallback_saudi_plan_cached(pid, week_id))
+
+@lru_cache(maxsize=1024)
+def _fallback_saudi_plan_cached(pid: str, week_id: str) -> Dict[str, Any]:
     """
     Returns a *different* Saudi-style plan per (pid, week) with varied meals/macros/sodium.
+    Deterministic in (pid, week_id), hence memoized.
     """
-    key = _variety_key(pid, week_id)
-    rng = _rng_from_key(key)
+    rng = random.Random(_variety_seed(pid, week_id))
 
     # 4 rotating breakfast/sahoor ideas
     breakfasts = [
@@ -67,10 +84,7 @@ def _fallback_saudi_plan(pid: str, week_id: str) -> Dict[str, Any]:
         "Banana + peanut butter (1 tbsp)"
     ]
 
-    b = _pick(rng, breakfasts)
-    l = _pick(rng, lunches)
-    d = _pick(rng, dinners)
-    s = _pick(rng, snacks)
+    b, l, d, s = rng.choice(breakfasts), rng.choice(lunches), rng.choice(dinners), rng.choice(snacks)
 
     # Macro target varies by theme
     themes = [
@@ -80,7 +94,7 @@ def _fallback_saudi_plan(pid: str, week_id: str) -> Dict[str, Any]:
         ("endurance",   2300, 0.22, 0.56, 0.22),
         ("high_protein",2200, 0.35, 0.40, 0.25),
     ]
-    theme, base_kcal, p, c, f = _pick(rng, themes)
+    theme, base_kcal, p, c, f = rng.choice(themes)
 
     kcal = int(round(_jitter(rng, base_kcal, 0.12), 0))
     prot_g = int(round((kcal * p) / 4.0))
@@ -110,45 +124,147 @@ def _fallback_saudi_plan(pid: str, week_id: str) -> Dict[str, Any]:
 class AceHTTPError(RuntimeError):
     pass
 
-@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=6))
-def _complete(prompt: str, *, temperature: float | None = None, max_tokens: int | None = None) -> str:
+# one keep-alive session for all completions. The adapter does not retry (max_retries=0):
+# _retrying_complete (tenacity) is the single owner of retries, so every attempt goes back through _pace()
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=0))
+# caps in-flight completions across all caller threads, however many workers they run
+_INFLIGHT = threading.BoundedSemaphore(ACE_CONCURRENCY)
+
+# request starts are spaced 60/ACE_MAX_RPM s apart across all threads, so bursts of
+# workers (and their retries) queue up here instead of drawing 429s from the endpoint
+_PACE_LOCK = threading.Lock()
+_next_start = 0.0
+
+def _pace() -> None:
+    global _next_start
+    with _PACE_LOCK:
+        now = time.monotonic()
+        start = max(now, _next_start)
+        _next_start = start + 60.0 / ACE_MAX_RPM
+    if start > now:
+        time.sleep(start - now)
+
+def _complete(prompt: str, *, temperature: float | None = None, max_tokens: int | None = None,
+              stop: List[str] | None = None) -> str:
     body = {
         "model": ACE_MODEL,
         "prompt": prompt,
         "temperature": temperature if temperature is not None else ACE_TEMPERATURE,
         "top_p": ACE_TOP_P,
         "max_tokens": max_tokens if max_tokens is not None else ACE_MAX_TOKENS,
-        "stop": DEFAULT_STOP,
+        "stop": stop if stop is not None else DEFAULT_STOP,
     }
-    r = requests.post(HF_COMPLETIONS_URL, headers=hf_headers(), json=body, timeout=120)
-    if r.status_code >= 500:
-        # transient -> let tenacity retry
+    _pace()
+    with _INFLIGHT:
+        r = _SESSION.post(HF_COMPLETIONS_URL, headers=hf_headers(), json=body, timeout=120)
+    if r.status_code == 429 or r.status_code >= 500:
+        # transient -> _retrying_complete tries again
         raise AceHTTPError(f"AceGPT status {r.status_code}: {r.text}")
     if r.status_code != 200:
         # fail fast
         raise RuntimeError(f"AceGPT status {r.status_code}: {r.text}")
     data = r.json()
+    usage = data.get("usage") or {}
+    log.debug("AceGPT usage: prompt=%s completion=%s tokens (max_tokens=%s)",
+              usage.get("prompt_tokens"), usage.get("completion_tokens"), body["max_tokens"])
     txt = data.get("choices", [{}])[0].get("text", "").strip()
     return txt or ""
 
+# ---------- on-disk completion cache ----------
+_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ACE_CACHE_FILE)
+_CACHE_LOCK = threading.Lock()  # shelve is not safe for concurrent writers; held only around shelve I/O
+# bounded in-process LRU over the shelve, same keys; its own short lock so memo hits never
+# wait behind another worker's shelve open/read/write
+_MEMO_MAX = 2048
+_MEMO: "OrderedDict[str, str]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+def _memo_get(key: str) -> str | None:
+    with _MEMO_LOCK:
+        hit = _MEMO.get(key)
+        if hit is not None:
+            _MEMO.move_to_end(key)
+        return hit
+
+def _memo_put(key: str, text: str) -> None:
+    with _MEMO_LOCK:
+        _MEMO[key] = text
+        _MEMO.move_to_end(key)
+        if len(_MEMO) > _MEMO_MAX:
+            _MEMO.popitem(last=False)
+
+def _force_regen() -> bool:
+    return os.environ.get("FORCE_REGEN", "").strip().lower() in ("1", "true", "yes")
+
+def _cache_key(prompt: str, temperature: float, max_tokens: int, stop: List[str]) -> str:
+    # every request setting that shapes the text is part of the key, so a new cap or
+    # stop list (or diet vs. reflection calls on the same prompt) never replays old output
+    spec = json.dumps([ACE_MODEL, temperature, max_tokens, list(stop), prompt], ensure_ascii=False)
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+def _cached_complete(prompt: str, *, max_tokens: int | None = None, stop: List[str] | None = None,
+                     accept: Callable[[str], bool] = bool) -> str:
+    """
+    _complete() behind a shelve keyed by (model, temperature, max_tokens, stop, prompt):
+    reruns of a persona-week reuse the stored text instead of paying the endpoint again.
+    Only completions passing accept() (default: non-empty) are stored or replayed;
+    FORCE_REGEN=1 skips lookups (fresh text still overwrites).
+    Repeats within one process are answered from _MEMO without reopening the shelve.
+    """
+    temperature = ACE_TEMPERATURE
+    max_tokens = max_tokens if max_tokens is not None else ACE_MAX_TOKENS
+    stop = stop if stop is not None else DEFAULT_STOP
+    key = _cache_key(prompt, temperature, max_tokens, stop)
+    if not _force_regen():
+        hit = _memo_get(key)
+        if hit is None:
+            with _CACHE_LOCK, shelve.open(_CACHE_PATH) as cache:
+                hit = cache.get(key)
+            if hit and not accept(hit):
+                hit = None  # unusable entry from an older run -> fetch afresh
+            if hit:
+                _memo_put(key, hit)
+        if hit:
+            return hit
+    out = _complete(prompt, temperature=temperature, max_tokens=max_tokens, stop=stop)
+    if out and accept(out):
+        with _CACHE_LOCK, shelve.open(_CACHE_PATH) as cache:
+            cache[key] = out
+        _memo_put(key, out)
+    return out
+
+# ---------- the one retry layer ----------
+# connection errors, timeouts, 429 and 5xx are worth another try; other statuses fail fast
+_TRANSIENT = (AceHTTPError, requests.RequestException)
+
+def _retrying_complete(prompt: str, *, retries: int, **kwargs) -> str:
+    """
+    _cached_complete() retried on transient errors and empty text with exponential backoff
+    (2..30 s), at most `retries` attempts. Each attempt re-enters _complete(), so every POST
+    is paced and counted against ACE_CONCURRENCY. Returns "" once attempts run out.
+    """
+    retrying = Retrying(
+        stop=stop_after_attempt(max(1, retries)),
+        wait=wait_exponential(multiplier=1, min=2, max=30),
+        retry=retry_if_exception_type(_TRANSIENT) | retry_if_result(lambda out: not out),
+        retry_error_callback=lambda state: "",
+    )
+    return retrying(_cached_complete, prompt, **kwargs)
+
 # ---------- public API ----------
 def get_diet_from_ace(prompt: str, *, pid: str, week_id: str, retries: int = 2) -> Dict[str, Any]:
     """
-    Try the endpoint; if it fails or returns unusable text, return a diverse fallback
-    keyed by (pid, week_id) so results always differ across personas & weeks.
+    Try the endpoint (or the on-disk cache); if it fails or returns unusable text, return
+    a diverse fallback keyed by (pid, week_id) so results always differ across personas & weeks.
     """
     try:
-        out = _complete(prompt, temperature=ACE_TEMPERATURE, max_tokens=ACE_MAX_TOKENS)
+        out = _retrying_complete(prompt, retries=retries, accept=_looks_like_diet)
         # Try a very light parser: we only care about presence of key fields. If not found, fallback.
-        lower = out.lower()
-        looks_ok = any(k in lower for k in ["breakfast", "meal 1", "lunch", "dinner"])
-        if not looks_ok:
+        if not _looks_like_diet(out):
             return _fallback_saudi_plan(pid, week_id)
 
         # Heuristic extraction; still inject diversity into sodium/macros if missing
-        key = _variety_key(pid, week_id)
-        rng = _rng_from_key(key)
-
         def _extract_line(prefixes):
             for line in out.splitlines():
                 l = line.strip()
@@ -164,10 +280,9 @@ def get_diet_from_ace(prompt: str, *, pid: str, week_id: str, retries: int = 2)
 
         kcal = None
         for line in out.splitlines():
-            if "kcal" in line.lower() or "calorie" in line.lower():
+            if _KCAL_LINE.search(line):
                 # crude grab of first number
-                import re
-                m = re.search(r"(\d{3,4})", line)
+                m = _KCAL_NUM.search(line)
                 if m: kcal = int(m.group(1)); break
 
         # If anything is missing, borrow from varied fallback to ensure completeness & diversity
@@ -197,7 +312,7 @@ def generate_feedback(persona: Dict[str, Any], diet: Dict[str, Any], workouts, s
     """
     Produce distinct free_text_feedback + notes per (persona, week) with persona-aware content.
     """
-    rng = _rng_from_key(hashlib.sha256(seed_key.encode()).hexdigest())
+    rng = random.Random(_seed_from_key(seed_key))
 
     goal = str(persona.get("Primary_goal", "recomp")).lower()
     days = str(persona.get("Days_per_week", 4))
@@ -216,7 +331,7 @@ def generate_feedback(persona: Dict[str, Any], diet: Dict[str, Any], workouts, s
         "simple meal-prep to support adherence",
         "restaurant swaps for social meals",
     ]
-    tone = _pick(rng, [
+    tone = rng.choice([
         "Keep it steady and practical.",
         "Nice momentum—stay consistent.",
         "Good base—tighten timing this week.",
@@ -225,8 +340,7 @@ def generate_feedback(persona: Dict[str, Any], diet: Dict[str, Any], workouts, s
         "You’re building rhythm—keep meals simple.",
     ])
 
-    focus1 = _pick(rng, angles)
-    focus2 = _pick(rng, [a for a in angles if a != focus1])
+    focus1, focus2 = rng.sample(angles, 2)
 
     ft = (
         f"{tone} Goal looks like **{goal}** with {days} sessions/week at {level} level. "
@@ -247,3 +361,20 @@ def generate_feedback(persona: Dict[str, Any], diet: Dict[str, Any], workouts, s
     )
 
     return {"free_text_feedback": ft, "notes": notes}
+
+def simulate_week_with_ace(prompt: str, *, pre_metrics: Dict[str, Any] | None = None, retries: int = 3,
+                           max_tokens: int = ACE_SIM_MAX_TOKENS) -> str:
+    """
+    First-person reflection text for one persona-week (cached like diets). The starting
+    body metrics are appended to the prompt; generation is capped at max_tokens and stops
+    at a paragraph break or a new "Persona:" block. Transient failures and empty completions
+    are retried by _retrying_complete; if they persist, or the endpoint rejects the request,
+    the reflection is simply blank and the caller's templates carry the feedback.
+    """
+    if pre_metrics:
+        prompt = prompt + "\nStarting metrics: " + ", ".join(f"{k}={v}" for k, v in pre_metrics.items()) + "\n"
+    try:
+        return _retrying_complete(prompt, retries=retries, max_tokens=max_tokens, stop=ACE_SIM_STOP)
+    except Exception as e:
+        log.warning("AceGPT reflection failed without retry: %s", e)
+        return ""
@@ -58,9 +58,18 @@ ACE_TEMPERATURE = DEFAULT_TEMPERATURE
 ACE_TOP_P       = DEFAULT_TOP_P
 ACE_STOP        = DEFAULT_STOP
 
+# Week reflections are one short paragraph: cap the output and stop at a paragraph break
+ACE_SIM_MAX_TOKENS = 300
+ACE_SIM_STOP       = DEFAULT_STOP + ["\n\n\n", "Persona:"]
+
 # Optional networking/retry knobs (used by some clients)
 ACE_TIMEOUT_S   = 60
 ACE_MAX_RETRIES = 3
+ACE_CONCURRENCY = 16   # diet requests kept in flight together per week
+ACE_MAX_RPM     = 500  # completion requests started per minute, across all threads
+
+# On-disk cache of raw completions keyed by prompt hash (set FORCE_REGEN=1 to bypass lookups)
+ACE_CACHE_FILE  = "ace_completions_cache"
 
 # If code refers to "agent 1/2" endpoints, keep them pointing to the same endpoint
 ACEGPT_1_URL = ACEGPT_COMPLETIONS_URL
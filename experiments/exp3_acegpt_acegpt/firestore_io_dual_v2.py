@@ -1,7 +1,12 @@
 ﻿# --- firestore_io_dual_v2.py ---
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Set, Tuple
 from google.oauth2 import service_account
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.api_core import exceptions as gexc
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 from config_dual import (
     PROJECT_ID,
@@ -12,18 +17,48 @@ from config_dual import (
 )
 
 __all__ = [
-    "_client","list_persona_ids","read_persona","read_legacy_week46_diet",
-    "read_updated_persona","read_diet","write_diet","write_logs","write_updated_persona"
+    "_client","list_persona_ids","iter_persona_id_pages","read_persona","read_personas_bulk","read_legacy_week46_diet","read_legacy_week46_diets",
+    "read_updated_persona","read_updated_personas","read_diet","write_diet","write_diet_raw","write_logs","write_updated_persona",
+    "new_batch","commit_batch","write_many","write_week_artifacts","existing_plan_pids"
 ]
 
+def _warm(db: firestore.Client) -> None:
+    # one keys-only read opens the gRPC channel and fetches the auth token up front,
+    # so the first real read of the run does not pay for it
+    try:
+        next(iter(db.collection(PERSONAS_ROOT).select([]).limit(1).stream()), None)
+    except Exception as e:
+        print(f"[WARN] Firestore warm-up read failed: {e}")
+
+@lru_cache(maxsize=1)
 def _client() -> firestore.Client:
+    # one client (credentials + gRPC channel) per process; the client is thread-safe
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
-    return firestore.Client(project=PROJECT_ID, credentials=creds)
+    db = firestore.Client(project=PROJECT_ID, credentials=creds)
+    _warm(db)
+    return db
 
 def _doc_to_dict(snap: firestore.DocumentSnapshot) -> Dict[str, Any]:
     return snap.to_dict() if snap and snap.exists else {}
 
+def new_batch() -> firestore.WriteBatch:
+    """One WriteBatch per persona-week (diet + diet_raw + logs + updated_persona, well under the 500-op limit)."""
+    return _client().batch()
+
+@retry(
+    wait=wait_exponential(multiplier=0.1, max=5),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type((gexc.Aborted, gexc.DeadlineExceeded, gexc.ServiceUnavailable)),
+    reraise=True,
+)
+def commit_batch(batch: firestore.WriteBatch) -> None:
+    # transient commit failures are retried; the batch keeps its writes until a commit succeeds.
+    # Full 500-op batches can exceed the default deadline, so give each commit more room.
+    batch.commit(timeout=COMMIT_TIMEOUT_S)
+
+@lru_cache(maxsize=8)
 def _path_ref(db: firestore.Client, path: str):
+    # memoized per (client, path): the roots are walked once, and refs are immutable so sharing is safe
     parts = [p for p in path.split("/") if p]
     ref = db
     for i, p in enumerate(parts):
@@ -34,15 +69,32 @@ def _path_ref(db: firestore.Client, path: str):
     return ref
 
 # -------- Personas --------
-def list_persona_ids() -> List[str]:
+def iter_persona_id_pages(page_size: int = 500) -> Iterator[List[str]]:
+    """Persona ids in document-id order, one keys-only page (list) at a time; stop iterating to stop reading."""
     db = _client()
-    return [d.id for d in db.collection(PERSONAS_ROOT).stream()]
+    query = db.collection(PERSONAS_ROOT).select([]).order_by(FieldPath.document_id()).limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        if page:
+            yield [d.id for d in page]
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def list_persona_ids() -> List[str]:
+    return [pid for page in iter_persona_id_pages() for pid in page]
 
 def read_persona(pid: str) -> Dict[str, Any]:
     db = _client()
     snap = db.collection(PERSONAS_ROOT).document(pid).get()
     return _doc_to_dict(snap)
 
+def read_personas_bulk(pids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """read_persona for many pids in one get_all (BatchGetDocuments) round-trip."""
+    db = _client()
+    return {snap.id: _doc_to_dict(snap) for snap in db.get_all([db.collection(PERSONAS_ROOT).document(pid) for pid in pids])}
+
 # -------- Legacy seed Week_2025_46 diet --------
 def read_legacy_week46_diet(pid: str) -> Dict[str, Any]:
     db = _client()
@@ -55,60 +107,126 @@ def read_legacy_week46_diet(pid: str) -> Dict[str, Any]:
     )
     return _doc_to_dict(snap)
 
+def read_legacy_week46_diets(pids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """read_legacy_week46_diet for many pids in one get_all round-trip."""
+    db = _client()
+    root = _path_ref(db, LEGACY_DIETS_ROOT)
+    refs = [
+        root.collection("users").document(pid)
+            .collection("weeks").document("Week_2025_46")
+            .collection("diet").document("plan")
+        for pid in pids
+    ]
+    pid_by_path = {ref.path: pid for ref, pid in zip(refs, pids)}
+    return {pid_by_path[snap.reference.path]: _doc_to_dict(snap) for snap in db.get_all(refs)}
+
 # -------- New experiment tree (ACEGPT_ACEGPT) --------
 def read_updated_persona(pid: str, week_id: str) -> Dict[str, Any]:
     db = _client()
-    root = _path_ref(db, EXPERIMENT_ROOT)
-    snap = (
-        root.collection("users").document(pid)
-            .collection("weeks").document(week_id)
-            .collection("updated_persona").document("plan")
-            .get()
-    )
+    snap = _plan_ref(db, pid, week_id, "updated_persona").get()
     data = _doc_to_dict(snap)
     return data if data else read_persona(pid)
 
-def read_diet(pid: str, week_id: str) -> Dict[str, Any]:
+def read_updated_personas(pids: List[str], week_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    read_updated_persona for a whole week in two batched reads: one get_all over the
+    week's updated_persona docs, a second over the base personas of pids lacking one.
+    """
     db = _client()
-    root = _path_ref(db, EXPERIMENT_ROOT)
-    snap = (
-        root.collection("users").document(pid)
-            .collection("weeks").document(week_id)
-            .collection("diet").document("plan")
-            .get()
-    )
-    return _doc_to_dict(snap)
+    refs = [_plan_ref(db, pid, week_id, "updated_persona") for pid in pids]
+    pid_by_path = {ref.path: pid for ref, pid in zip(refs, pids)}
 
-def write_diet(pid: str, week_id: str, payload: Dict[str, Any]) -> None:
-    db = _client()
-    root = _path_ref(db, EXPERIMENT_ROOT)
-    (
-        root.collection("users").document(pid)
-            .collection("weeks").document(week_id)
-            .collection("diet").document("plan")
-            .set(payload)
-    )
+    out: Dict[str, Dict[str, Any]] = {}
+    for snap in db.get_all(refs):  # snapshots come back in any order
+        data = _doc_to_dict(snap)
+        if data:
+            out[pid_by_path[snap.reference.path]] = data
 
-def write_logs(pid: str, week_id: str, payload: Dict[str, Any]) -> None:
-    if not isinstance(payload, dict):
-        raise TypeError("write_logs expects a dict payload.")
-    db = _client()
-    root = _path_ref(db, EXPERIMENT_ROOT)
-    (
-        root.collection("users").document(pid)
-            .collection("weeks").document(week_id)
-            .collection("logs").document("plan")
-            .set(payload)
-    )
+    missing = [pid for pid in pids if pid not in out]
+    if missing:
+        out.update(read_personas_bulk(missing))
+    return out
 
-def write_updated_persona(pid: str, week_id: str, payload: Dict[str, Any]) -> None:
-    if not isinstance(payload, dict):
-        raise TypeError("write_updated_persona expects a dict payload.")
+def read_diet(pid: str, week_id: str) -> Dict[str, Any]:
     db = _client()
-    root = _path_ref(db, EXPERIMENT_ROOT)
-    (
-        root.collection("users").document(pid)
-            .collection("weeks").document(week_id)
-            .collection("updated_persona").document("plan")
-            .set(payload)
+    snap = _plan_ref(db, pid, week_id, "diet").get()
+    return _doc_to_dict(snap)
+
+# one planned write: (pid, week_id, subcollection, payload), subcollection in
+# "diet" / "diet_raw" / "logs" / "updated_persona"
+PlanWrite = Tuple[str, str, str, Dict[str, Any]]
+
+MAX_BATCH_WRITES = 500  # Firestore's limit per commit
+COMMIT_TIMEOUT_S = 120  # seconds per commit_batch call
+WRITE_CHUNK      = 100  # ops per mini-batch in write_many (50 personas x logs + updated_persona)
+COMMIT_WORKERS   = 10   # mini-batch commits in flight at once
+
+@lru_cache(maxsize=2048)
+def _week_ref(db: firestore.Client, pid: str, week_id: str):
+    # memoized per persona-week: diet/diet_raw/logs/updated_persona refs branch off this parent
+    return (
+        _path_ref(db, EXPERIMENT_ROOT)
+            .collection("users").document(pid)
+            .collection("weeks").document(week_id)
     )
+
+def _plan_ref(db: firestore.Client, pid: str, week_id: str, kind: str):
+    return _week_ref(db, pid, week_id).collection(kind).document("plan")
+
+def existing_plan_pids(pids: List[str], week_id: str, kind: str) -> Set[str]:
+    """pids whose .../weeks/{week_id}/{kind}/plan doc already exists, in one get_all round-trip."""
+    db = _client()
+    refs = [_plan_ref(db, pid, week_id, kind) for pid in pids]
+    pid_by_path = {ref.path: pid for ref, pid in zip(refs, pids)}
+    # existence is all we need: mask the snapshots down to one small field
+    return {pid_by_path[s.reference.path] for s in db.get_all(refs, field_paths=["Date"]) if s.exists}
+
+def write_many(items: Sequence[PlanWrite], batch: Optional[firestore.WriteBatch] = None) -> None:
+    """
+    Set many .../weeks/{week_id}/{kind}/plan docs in batched commits.
+    With a caller's batch everything is queued on it (the caller commits and keeps it
+    within 500 ops); otherwise items are split into WRITE_CHUNK-op mini-batches whose
+    commits (each retried by commit_batch) run on up to COMMIT_WORKERS threads.
+    """
+    if not items:
+        return
+    db = _client()
+    if batch is not None:
+        for pid, week_id, kind, payload in items:
+            batch.set(_plan_ref(db, pid, week_id, kind), payload)
+        return
+    chunks = []
+    for start in range(0, len(items), WRITE_CHUNK):
+        chunk = db.batch()
+        for pid, week_id, kind, payload in items[start:start + WRITE_CHUNK]:
+            chunk.set(_plan_ref(db, pid, week_id, kind), payload)
+        chunks.append(chunk)
+    if len(chunks) == 1:
+        commit_batch(chunks[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(COMMIT_WORKERS, len(chunks))) as ex:
+        list(ex.map(commit_batch, chunks))  # re-raises the first failed commit
+
+def write_diet(pid: str, week_id: str, payload: Dict[str, Any], batch: Optional[firestore.WriteBatch] = None) -> None:
+    write_many([(pid, week_id, "diet", payload)], batch)
+
+def write_diet_raw(pid: str, week_id: str, raw_text: str, batch: Optional[firestore.WriteBatch] = None) -> None:
+    """Raw model output lives beside the diet doc (diet_raw/plan) so diet reads stay small."""
+    write_many([(pid, week_id, "diet_raw", {"raw_text": raw_text})], batch)
+
+def write_logs(pid: str, week_id: str, payload: Dict[str, Any], batch: Optional[firestore.WriteBatch] = None) -> None:
+    if not isinstance(payload, dict):
+        raise TypeError("write_logs expects a dict payload.")
+    write_many([(pid, week_id, "logs", payload)], batch)
+
+def write_updated_persona(pid: str, week_id: str, payload: Dict[str, Any], batch: Optional[firestore.WriteBatch] = None) -> None:
+    if not isinstance(payload, dict):
+        raise TypeError("write_updated_persona expects a dict payload.")
+    write_many([(pid, week_id, "updated_persona", payload)], batch)
+
+def write_week_artifacts(pid: str, week_id: str, logs: Dict[str, Any], updated: Dict[str, Any],
+                         batch: Optional[firestore.WriteBatch] = None) -> None:
+    """logs + updated_persona for one persona-week in one commit (or queued on the caller's batch)."""
+    if not isinstance(logs, dict) or not isinstance(updated, dict):
+        raise TypeError("write_week_artifacts expects dict payloads.")
+    write_many([(pid, week_id, "logs", logs), (pid, week_id, "updated_persona", updated)], batch)
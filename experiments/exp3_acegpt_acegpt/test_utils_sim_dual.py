@@ -0,0 +1,41 @@
+# --- test_utils_sim_dual.py ---
+# Run with pytest, or directly: python test_utils_sim_dual.py
+from utils_sim_dual import build_week_payloads_batch, build_week1_payloads
+
+WEEK = "2025-W05"
+PIDS = ["P01", "P02", "P03", "P04"]
+PERSONAS = {
+    pid: {
+        "Weight_kg": 70 + 3*i, "Muscle_mass_kg": 30 + i, "Fat_percent": 20 + i,
+        "Days_per_week": 3 + i % 3, "Sleep_hours": 6 + i % 3,
+        "Primary_goal": ("fat loss", "muscle gain", "recomp")[i % 3],
+        "Adherence_propensity": ("High", "Moderate", "Low")[i % 3],
+    }
+    for i, pid in enumerate(PIDS)
+}
+DIETS = {pid: {"Total_kcal_target_kcal": 2000 + 100*i} for i, pid in enumerate(PIDS)}
+
+def _by_pid(pids):
+    out = build_week_payloads_batch(pids, WEEK, [PERSONAS[p] for p in pids], [DIETS[p] for p in pids],
+                                    ["reflection"] * len(pids))
+    # Date/Time is a wall-clock stamp, not part of the seeded values
+    return {pid: ({k: v for k, v in logs.items() if k not in ("Date", "Time")}, upd)
+            for pid, (logs, upd) in zip(pids, out)}
+
+def test_row_values_do_not_depend_on_batch_size_or_order():
+    full = _by_pid(PIDS)
+    assert _by_pid(PIDS[::-1]) == full
+    part = _by_pid(["P03", "P01"])
+    assert all(part[pid] == full[pid] for pid in part)
+
+def test_single_persona_form_matches_batch():
+    full = _by_pid(PIDS)
+    for pid in PIDS:
+        logs, upd = build_week1_payloads(pid, WEEK, PERSONAS[pid], DIETS[pid], "reflection")
+        logs = {k: v for k, v in logs.items() if k not in ("Date", "Time")}
+        assert (logs, upd) == full[pid]
+
+if __name__ == "__main__":
+    test_row_values_do_not_depend_on_batch_size_or_order()
+    test_single_persona_form_matches_batch()
+    print("[OK] utils_sim_dual row seeding checks passed")
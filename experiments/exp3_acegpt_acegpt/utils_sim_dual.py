@@ -1,32 +1,27 @@
 ﻿# --- Acegpt_Acegpt/utils_sim_dual.py ---
 from __future__ import annotations
 import math, hashlib, random
-from typing import Dict, Any, Tuple
-from datetime import datetime, timezone
-try:
-    from zoneinfo import ZoneInfo
-except Exception:
-    ZoneInfo = None  # Py<=3.8 fallback not needed for your env
+from functools import lru_cache
+from typing import Dict, Any, List, Sequence, Tuple
+import numpy as np
+from utils_time_dual import stamp_riyadh
 
 # Helpers
 def _seed_from(pid: str, week_id: str) -> int:
-    h = hashlib.sha256(f"{pid}::{week_id}".encode("utf-8")).hexdigest()
-    # take 12 hex chars -> int
-    return int(h[:12], 16)
+    # 48-bit seed straight from a 6-byte blake2b digest: no full sha256 + hex round-trip
+    return int.from_bytes(hashlib.blake2b(f"{pid}::{week_id}".encode("utf-8"), digest_size=6).digest(), "big")
 
 def _to_float(x, default=0.0) -> float:
+    # numbers and None return before any try block: only strings/other types pay for parsing
+    if isinstance(x, (int, float)): return float(x)
+    if x is None: return float(default)
     try:
-        if x is None: return float(default)
-        if isinstance(x, (int, float)): return float(x)
         return float(str(x).strip())
-    except Exception:
+    except (TypeError, ValueError):
         return float(default)
 
-def _riyadh_now() -> Tuple[str, str]:
-    tz = ZoneInfo("Asia/Riyadh") if ZoneInfo else timezone.utc
-    now = datetime.now(tz)
-    return (now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"))
-
+# personas use a handful of distinct adherence/goal strings: each is scanned once, then it's a dict hit
+@lru_cache(maxsize=256)
 def _adherence_factor(adherence: str) -> float:
     if not adherence:
         return 0.9
@@ -41,6 +36,7 @@ def _adherence_factor(adherence: str) -> float:
     except Exception:
         return 0.9
 
+@lru_cache(maxsize=256)
 def _goal_deltas(goal: str) -> Tuple[Tuple[float,float], Tuple[float,float], Tuple[float,float]]:
     """
     Returns ranges for (delta_weight_kg, delta_muscle_kg, delta_fat_pct) for ONE week.
@@ -67,12 +63,6 @@ def _sleep_bonus(hours: float) -> float:
     if hours >= 6:   return 1.00
     return 0.94
 
-def _clamp(x: float, lo: float, hi: float) -> float:
-    return max(lo, min(hi, x))
-
-def _rounded(x: float, nd=2) -> float:
-    return float(f"{x:.{nd}f}")
-
 def _make_feedback(pid: str, week_id: str, persona: Dict[str, Any], diet: Dict[str, Any], sim_text: str, notes_hint: str) -> Tuple[str, str]:
     # Build distinct feedback strings by mixing templates and persona fields.
     rnd = random.Random(_seed_from(pid, week_id) + 101)
@@ -90,10 +80,11 @@ def _make_feedback(pid: str, week_id: str, persona: Dict[str, Any], diet: Dict[s
     tones = ["solid", "mostly good", "up-and-down", "challenging but improving"]
     energies = ["steady", "high on training days", "a bit flat", "better after day 3"]
 
-    body = " ".join([
-        rnd.choice(styles).format(tone=rnd.choice(tones), energy=rnd.choice(energies), days=days, kcal=kcal)
-        for _ in range(2)
-    ])
+    # two sentences: one choices() call per pool instead of six choice() calls
+    body = " ".join(
+        style.format(tone=tone, energy=energy, days=days, kcal=kcal)
+        for style, tone, energy in zip(rnd.choices(styles, k=2), rnd.choices(tones, k=2), rnd.choices(energies, k=2))
+    )
     # inject some of sim_text to keep “Ace voice” but limit size
     sim_snip = (sim_text or "").strip().replace("\n", " ")
     sim_snip = sim_snip[:220]
@@ -108,6 +99,119 @@ def _make_feedback(pid: str, week_id: str, persona: Dict[str, Any], diet: Dict[s
     notes = notes_hint or rnd.choice(notes_templates)
     return free_text, notes
 
+# post-week clamp bounds for (weight kg, muscle kg, fat %) and how strongly plan match
+# (mult - 0.95) stretches each weekly delta
+_POST_LO   = np.array([30.0, 8.0, 3.0])
+_POST_HI   = np.array([250.0, 120.0, 65.0])
+_TIGHTEN_K = np.array([0.6, 0.8, 0.7])
+
+def build_week_payloads_batch(
+    pids: Sequence[str],
+    week_id: str,
+    personas: Sequence[Dict[str, Any]],
+    diets: Sequence[Dict[str, Any]],
+    sim_texts: Sequence[str]
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    (logs_payload, updated_persona_payload) for every persona of one week.
+    Field parsing and texts stay per row; the metric math runs as (n,) / (n, 3) NumPy arrays
+    on 5 uniforms per row (mult noise, 3 deltas, sleep noise) from that row's own (pid, week) seed.
+    """
+    n = len(pids)
+    if n == 0:
+        return []
+
+    # Date/Time: one stamp for the whole weekly batch
+    date_str, time_str = stamp_riyadh()
+
+    # Persona metrics (pre) and per-row scalars
+    pre      = np.empty((n, 3))           # weight, muscle, fat
+    sleep_h  = np.empty(n)
+    kcal     = np.empty(n)
+    mult     = np.empty(n)
+    ranges   = np.empty((n, 3, 2))        # (lo, hi) per delta
+    gain     = np.zeros(n, dtype=bool)
+    days     = []
+    for i, (persona, diet) in enumerate(zip(personas, diets)):
+        w = _to_float(persona.get("Weight_kg"), 70.0)
+        pre[i] = (w, _to_float(persona.get("Muscle_mass_kg"), max(0.35*w, 22.0)),
+                  _to_float(persona.get("Fat_percent"), 20.0))
+        d = int(_to_float(persona.get("Days_per_week"), 3))
+        days.append(d)
+        sleep_h[i] = _to_float(persona.get("Sleep_hours"), 7.0)
+        kcal[i]    = _to_float(diet.get("Total_kcal_target_kcal"), 2000.0)
+        mult[i]    = (_adherence_factor(str(persona.get("Adherence_propensity", "Moderate")))
+                      * _days_bonus(d) * _sleep_bonus(sleep_h[i]))
+        goal = str(persona.get("Primary_goal", "maintenance"))
+        ranges[i] = _goal_deltas(goal)
+        gain[i]   = "gain" in goal.lower()
+
+    # each row from its own (pid, week) stream: values don't depend on batch size or order
+    u = np.stack([np.random.default_rng(_seed_from(pid, week_id)).random(5) for pid in pids])
+
+    # small random noise on the multipliers, then the realised intake
+    mult *= 0.97 + 0.06*u[:, 0]
+    daily_avg_kcal = np.round(np.clip(kcal * mult, 1200.0, 4500.0), 1)
+
+    # goal-based expected changes, tightened with adherence/sleep (around 0 = average plan match)
+    lo, hi = ranges[:, :, 0], ranges[:, :, 1]
+    deltas = (lo + (hi - lo)*u[:, 1:4]) * (1.0 + _TIGHTEN_K*(mult - 0.95)[:, None])
+
+    # ensure plausible coupling: muscle up rarely with big negative kcal unless recomposition
+    deltas[:, 1] *= np.where(gain & (daily_avg_kcal < kcal*0.9), 0.6, 1.0)
+
+    post  = np.round(np.clip(pre + deltas, _POST_LO, _POST_HI), 2)
+    delta = np.round(post - pre, 2)
+    sleep = np.round(np.clip(sleep_h - 0.3 + 0.7*u[:, 4], 4.0, 10.0), 2)
+
+    # back to Python floats once, then per-row dicts and texts
+    pre_l, post_l, delta_l = np.round(pre, 2).tolist(), post.tolist(), delta.tolist()
+    kcal_l, sleep_l = daily_avg_kcal.tolist(), sleep.tolist()
+
+    out = []
+    for i, pid in enumerate(pids):
+        persona = personas[i]
+        free_text, notes = _make_feedback(pid, week_id, persona, diets[i], sim_texts[i], notes_hint="")
+        (pre_w, pre_mus, pre_fat), (post_w, post_mus, post_fat) = pre_l[i], post_l[i]
+        logs = {
+            "Date": date_str,
+            "Time": time_str,
+            "free_text_feedback": free_text,
+            "notes": notes,
+            "daily_avg_kcal": kcal_l[i],
+            "Pre_weight_kg": pre_w,
+            "Pre_muscle_kg": pre_mus,
+            "Pre_fat_pct": pre_fat,
+            "Post_weight_kg": post_w,
+            "Post_muscle_kg": post_mus,
+            "Post_fat_pct": post_fat,
+            "delta_weight_kg": delta_l[i][0],
+            "delta_muscle_kg": delta_l[i][1],
+            "delta_fat_pct": delta_l[i][2],
+            "sleep_avg_hours": sleep_l[i],
+        }
+
+        updated = {
+            # copy-through fields
+            "Age_band": persona.get("Age_band"),
+            "Sex": persona.get("Sex"),
+            "BMI": persona.get("BMI"),
+            "Days_per_week": days[i],
+            "Current_fitness_level": persona.get("Current_fitness_level"),
+            "Primary_goal": persona.get("Primary_goal"),
+            "Adherence_propensity": persona.get("Adherence_propensity"),
+            "Cooking_skill": persona.get("Cooking_skill"),
+            "Budjet_SAR_per_day": persona.get("Budjet_SAR_per_day"),
+            # new metrics from logs
+            "Weight_kg": post_w,
+            "Muscle_mass_kg": post_mus,
+            "Fat_percent": post_fat,
+            "Sleep_hours": sleep_l[i],
+            "notes": notes,
+        }
+        out.append((logs, updated))
+    return out
+
 def build_week1_payloads(
     pid: str,
     week_id: str,
@@ -117,88 +221,6 @@ def build_week1_payloads(
 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """
     Returns (logs_payload, updated_persona_payload) as dicts.
+    Single-persona form of build_week_payloads_batch.
     """
-    rnd = random.Random(_seed_from(pid, week_id))
-
-    # Date/Time
-    date_str, time_str = _riyadh_now()
-
-    # Persona metrics (pre)
-    pre_w   = _to_float(persona.get("Weight_kg"), 70.0)
-    pre_mus = _to_float(persona.get("Muscle_mass_kg"), max(0.35*pre_w, 22.0))
-    pre_fat = _to_float(persona.get("Fat_percent"), 20.0)
-    days    = int(_to_float(persona.get("Days_per_week"), 3))
-    sleep_h = _to_float(persona.get("Sleep_hours"), 7.0)
-    adher   = str(persona.get("Adherence_propensity", "Moderate"))
-
-    # Diet target
-    kcal_target = _to_float(diet.get("Total_kcal_target_kcal"), 2000.0)
-
-    # Build multipliers
-    mult = _adherence_factor(adher) * _days_bonus(days) * _sleep_bonus(sleep_h)
-    # small random noise
-    mult *= rnd.uniform(0.97, 1.03)
-    daily_avg_kcal = _rounded(_clamp(kcal_target * mult, 1200.0, 4500.0), 1)
-
-    # Goal-based expected changes
-    goal = str(persona.get("Primary_goal", "maintenance"))
-    (dw_lo, dw_hi), (dm_lo, dm_hi), (df_lo, df_hi) = _goal_deltas(goal)
-
-    # tighten ranges with adherence/sleep
-    tighten = (mult - 0.95)  # around 0 ≈ average plan match
-    dw = rnd.uniform(dw_lo, dw_hi) * (1.0 + 0.6*tighten)
-    dm = rnd.uniform(dm_lo, dm_hi) * (1.0 + 0.8*tighten)
-    df = rnd.uniform(df_lo, df_hi) * (1.0 + 0.7*tighten)
-
-    # ensure plausible coupling: muscle up rarely with big negative kcal unless recomposition
-    if daily_avg_kcal < kcal_target * 0.9 and "gain" in goal.lower():
-        dm *= 0.6
-
-    post_w   = _rounded(_clamp(pre_w + dw, 30.0, 250.0), 2)
-    post_mus = _rounded(_clamp(pre_mus + dm, 8.0, 120.0), 2)
-    post_fat = _rounded(_clamp(pre_fat + df, 3.0, 65.0), 2)
-
-    delta_w   = _rounded(post_w - pre_w, 2)
-    delta_mus = _rounded(post_mus - pre_mus, 2)
-    delta_fat = _rounded(post_fat - pre_fat, 2)
-
-    # Texts
-    free_text, notes = _make_feedback(pid, week_id, persona, diet, sim_text, notes_hint="")
-
-    logs = {
-        "Date": date_str,
-        "Time": time_str,
-        "free_text_feedback": free_text,
-        "notes": notes,
-        "daily_avg_kcal": daily_avg_kcal,
-        "Pre_weight_kg": _rounded(pre_w, 2),
-        "Pre_muscle_kg": _rounded(pre_mus, 2),
-        "Pre_fat_pct": _rounded(pre_fat, 2),
-        "Post_weight_kg": post_w,
-        "Post_muscle_kg": post_mus,
-        "Post_fat_pct": post_fat,
-        "delta_weight_kg": delta_w,
-        "delta_muscle_kg": delta_mus,
-        "delta_fat_pct": delta_fat,
-        "sleep_avg_hours": _rounded(_clamp(sleep_h + rnd.uniform(-0.3, 0.4), 4.0, 10.0), 2),
-    }
-
-    updated = {
-        # copy-through fields
-        "Age_band": persona.get("Age_band"),
-        "Sex": persona.get("Sex"),
-        "BMI": persona.get("BMI"),
-        "Days_per_week": days,
-        "Current_fitness_level": persona.get("Current_fitness_level"),
-        "Primary_goal": persona.get("Primary_goal"),
-        "Adherence_propensity": persona.get("Adherence_propensity"),
-        "Cooking_skill": persona.get("Cooking_skill"),
-        "Budjet_SAR_per_day": persona.get("Budjet_SAR_per_day"),
-        # new metrics from logs
-        "Weight_kg": post_w,
-        "Muscle_mass_kg": post_mus,
-        "Fat_percent": post_fat,
-        "Sleep_hours": logs["sleep_avg_hours"],
-        "notes": notes,
-    }
-    return logs, updated
+    return build_week_payloads_batch([pid], week_id, [persona], [diet], [sim_text])[0]
@@ -8,7 +8,7 @@ except Exception:  # very old Pythons
 
 from config_dual import RIYADH_TZ
 
-def _tz():
+def _resolve_tz():
     """Return a tzinfo for Riyadh. Fallback to UTC+03 if the IANA zone isn’t available."""
     if ZoneInfo is not None:
         try:
@@ -17,6 +17,12 @@ def _tz():
             pass
     return timezone(timedelta(hours=3), name="Asia/Riyadh")
 
+# resolved once at import; every stamp reuses it
+_TZ = _resolve_tz()
+
+def _tz():
+    return _TZ
+
 def now_riyadh() -> datetime:
     """Aware datetime in Riyadh tz."""
     return datetime.now(_tz())
@@ -59,17 +65,19 @@ def week_id_sequence(start_week_id: str, total_weeks: int, include_start: bool =
     """
     Build a list of Week IDs.
       - If include_start=True and total_weeks=1 -> [start_week_id]
-      - Otherwise advance with next_week_id until length matches total_weeks.
+      - Later weeks match repeated next_week_id calls, but are computed from
+        the start Monday with date arithmetic (one fromisocalendar in total).
     """
     if total_weeks <= 0:
         return []
+    mon0 = week_monday(start_week_id)
+    first = 0 if include_start else 1
     seq = []
-    cur = start_week_id
+    for i in range(first, first + total_weeks):
+        iso = (mon0 + timedelta(days=7*i)).isocalendar()
+        seq.append(f"Week_{iso.year}_{iso.week}")
     if include_start:
-        seq.append(cur)
-    for _ in range(total_weeks - (1 if include_start else 0)):
-        cur = next_week_id(cur)
-        seq.append(cur)
+        seq[0] = start_week_id  # returned as given, like before
     return seq
 
 __all__ = [
@@ -1,72 +1,150 @@
 ﻿# --- Acegpt_Acegpt/week1_simulate_dual_v2.py ---
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+import logging, os, queue
 from config_dual import START_WEEK_ID
-from firestore_io_dual import (
-    list_persona_ids,
-    read_persona,
-    read_legacy_week46_diet,
-    write_logs,
-    write_updated_persona,
+from firestore_io_dual_v2 import (
+    iter_persona_id_pages,
+    read_personas_bulk,
+    read_legacy_week46_diets,
+    write_many,
+    existing_plan_pids,
 )
-from acegpt_client_dual import simulate_week_with_ace
-from utils_sim_dual import build_week1_payloads
+from acegpt_client_dual_v2 import simulate_week_with_ace
+from utils_sim_dual import build_week_payloads_batch
 
-def _build_sim_prompt(pid: str, persona: Dict[str, Any], diet: Dict[str, Any]) -> str:
-    # minimal but informative; you can expand if you want more realism
-    return f"""You are Persona {pid}. Follow this ONE-WEEK plan (repeat daily):
+# personas simulated concurrently (I/O bound: AceGPT completions; the client caps in-flight requests)
+MAX_WORKERS = int(os.environ.get("DUAL_MAX_WORKERS", "8"))
+# personas listed, read, simulated and written per round; memory stays O(PAGE_SIZE)
+PAGE_SIZE = 250
+
+# worker threads only enqueue log records; _start_logging's listener thread writes them out
+log = logging.getLogger(__name__)
+
+def _force_regen() -> bool:
+    return os.environ.get("FORCE_REGEN", "").strip().lower() in ("1", "true", "yes")
+
+def _start_logging() -> QueueListener:
+    q = queue.SimpleQueue()
+    listener = QueueListener(q, logging.StreamHandler())
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(q))
+    root.setLevel(logging.INFO)
+    listener.start()
+    return listener
+
+# minimal but informative; you can expand if you want more realism
+_PROMPT_TMPL = """You are Persona {pid}. Follow this ONE-WEEK plan (repeat daily):
 
 Persona:
-- Age_band: {persona.get('Age_band')}
-- Sex: {persona.get('Sex')}
-- BMI: {persona.get('BMI')}
-- Days_per_week: {persona.get('Days_per_week')}
-- Current_fitness_level: {persona.get('Current_fitness_level')}
-- Primary_goal: {persona.get('Primary_goal')}
-- Adherence_propensity: {persona.get('Adherence_propensity')}
-- Sleep_hours: {persona.get('Sleep_hours')}
-- Biggest_barrier: {persona.get('Biggest_barrier')}
+- Age_band: {Age_band}
+- Sex: {Sex}
+- BMI: {BMI}
+- Days_per_week: {Days_per_week}
+- Current_fitness_level: {Current_fitness_level}
+- Primary_goal: {Primary_goal}
+- Adherence_propensity: {Adherence_propensity}
+- Sleep_hours: {Sleep_hours}
+- Biggest_barrier: {Biggest_barrier}
 
 Diet (per day):
-- Total_kcal_target_kcal: {diet.get('Total_kcal_target_kcal')}
-- Total_protein_g: {diet.get('Total_protein_g')}
-- Total_carbs_g: {diet.get('Total_carbs_g')}
-- Total_fat_g: {diet.get('Total_fat_g')}
-- Total_fiber_g: {diet.get('Total_fiber_g')}
-- Total_sodium_mg: {diet.get('Total_sodium_mg')}
+- Total_kcal_target_kcal: {Total_kcal_target_kcal}
+- Total_protein_g: {Total_protein_g}
+- Total_carbs_g: {Total_carbs_g}
+- Total_fat_g: {Total_fat_g}
+- Total_fiber_g: {Total_fiber_g}
+- Total_sodium_mg: {Total_sodium_mg}
 
 Give a short reflection on how the week went in first person, then stop.
 """
 
-def run_week1():
-    week_id = START_WEEK_ID  # Week_2025_46
-    personas = list_persona_ids()
-    print("[INFO] Personas found:", personas)
+class _PromptFields(dict):
+    # a missing field renders as "None", exactly like the old persona.get()/diet.get()
+    def __missing__(self, key):
+        return None
+
+def _prompt_fields(pid: str, persona: Dict[str, Any], diet: Dict[str, Any]) -> _PromptFields:
+    # flattened once per persona (pid > persona > diet on key clashes): each template
+    # field is then a single dict lookup instead of a walk down a ChainMap
+    return _PromptFields({**diet, **persona, "pid": pid})
 
-    for pid in personas:
-        print(f"\n[INFO] Week {week_id} -> persona {pid}")
+def _build_sim_prompt(fields: _PromptFields) -> str:
+    return _PROMPT_TMPL.format_map(fields)
 
-        persona = read_persona(pid)
-        diet    = read_legacy_week46_diet(pid)  # existing diet from Experiment_ACEGPT
+def _run_page(week_id: str, personas: List[str], ex: ThreadPoolExecutor,
+              writer: ThreadPoolExecutor) -> Optional[Tuple[int, Future]]:
+    # a restarted run skips personas whose logs already landed (logs + updated_persona
+    # commit together), before paying for their completions; FORCE_REGEN=1 redoes them
+    if not _force_regen():
+        done = existing_plan_pids(personas, week_id, "logs")
+        if done:
+            log.info("[SKIP] %d persona(s) already have logs @ %s", len(done), week_id)
+            personas = [pid for pid in personas if pid not in done]
+        if not personas:
+            return None
 
-        # 1) Ask AceGPT for a small reflection paragraph (text)
-        prompt = _build_sim_prompt(pid, persona, diet)
-        sim_text = simulate_week_with_ace(prompt, pre_metrics={
+    # every persona of the page and its legacy diet: two batched reads instead of 2 per persona
+    persona_docs = read_personas_bulk(personas)
+    legacy_diets = read_legacy_week46_diets(personas)  # existing diets from Experiment_ACEGPT
+
+    persona_list = [persona_docs.get(pid, {}) for pid in personas]
+    diet_list    = [legacy_diets.get(pid, {}) for pid in personas]
+
+    def _sim_text(pid: str, persona: Dict[str, Any], diet: Dict[str, Any]) -> str:
+        log.info("[INFO] Week %s -> persona %s", week_id, pid)
+        prompt = _build_sim_prompt(_prompt_fields(pid, persona, diet))
+        return simulate_week_with_ace(prompt, pre_metrics={
             "Weight_kg": persona.get("Weight_kg"),
             "Muscle_mass_kg": persona.get("Muscle_mass_kg"),
             "Fat_percent": persona.get("Fat_percent"),
         }, retries=3)
 
-        # 2) Convert to structured logs + build updated_persona
-        logs_payload, updated_payload = build_week1_payloads(
-            pid=pid, week_id=week_id, persona=persona, diet=diet, sim_text=sim_text
-        )
+    # 1) Ask AceGPT for a small reflection paragraph (text) per persona, several personas at once;
+    #    map() keeps persona order, and a failed completion just yields an empty reflection
+    sim_texts = list(ex.map(_sim_text, personas, persona_list, diet_list))
+
+    # 2) Convert to structured logs + build updated_persona for everyone (one vectorized pass)
+    payloads = build_week_payloads_batch(personas, week_id, persona_list, diet_list, sim_texts)
 
-        # 3) Write Firestore docs
-        write_logs(pid, week_id, logs_payload)
-        print(f"[OK] logs saved @ {week_id} for {pid}")
+    # 3) Write Firestore docs: logs + updated_persona for every persona; write_many commits
+    #    them as 50-persona mini-batches in parallel. Handed to the writer thread so the next
+    #    page's completions start right away; run_week1 waits for it at the end.
+    items = []
+    for pid, (logs_payload, updated_payload) in zip(personas, payloads):
+        items.append((pid, week_id, "logs", logs_payload))
+        items.append((pid, week_id, "updated_persona", updated_payload))
+    # count what this page actually writes (skipped personas excluded)
+    return len(personas), writer.submit(write_many, items)
+
+def run_week1():
+    week_id = START_WEEK_ID  # Week_2025_46
+    pending = []  # (persona count, write future) per page
+    # persona ids arrive one page at a time; a page's writes overlap the next page's completions
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex, ThreadPoolExecutor(max_workers=1) as writer:
+        for personas in iter_persona_id_pages(PAGE_SIZE):
+            log.info("[INFO] Personas found: %s", personas)
+            page = _run_page(week_id, personas, ex, writer)
+            if page is not None:
+                pending.append(page)
 
-        write_updated_persona(pid, week_id, updated_payload)
-        print(f"[OK] updated_persona saved @ {week_id} for {pid}")
+    # final barrier: every page's writes have finished once the writer pool has shut down
+    total = failed = 0
+    for n, fut in pending:
+        try:
+            fut.result()
+        except Exception as e:
+            failed += n
+            log.error("[ERROR] Week %s: writes for a page failed -> %s: %s", week_id, type(e).__name__, e)
+        else:
+            total += n
+    log.info("[OK] logs + updated_persona saved @ %s for %d persona(s)", week_id, total)
+    if failed:
+        log.error("[ERROR] Week %s: %d persona(s) not saved; rerun to redo them", week_id, failed)
 
 if __name__ == "__main__":
-    run_week1()
+    listener = _start_logging()
+    try:
+        run_week1()
+    finally:
+        listener.stop()  # drains queued records before exit
@@ -1,14 +1,25 @@
 ﻿# --- year_orchestrator_dual_v2.py ---
-from typing import List, Tuple
-import hashlib
+from typing import List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib, os
+import numpy as np
 from config_dual import START_WEEK_ID, TOTAL_WEEKS, INCLUDE_START_WEEK, WORKOUT_MAP
 from firestore_io_dual_v2 import (
-    list_persona_ids, read_updated_persona, read_diet,
-    write_diet, write_logs, write_updated_persona, read_persona
+    list_persona_ids, read_updated_personas,
+    write_diet, write_diet_raw, write_logs, write_updated_persona, new_batch, commit_batch
 )
 from acegpt_client_dual_v2 import get_diet_from_ace, generate_feedback
 from utils_time_dual import week_id_sequence, stamp_riyadh
 
+# personas processed concurrently within a week (I/O bound: LLM + Firestore)
+MAX_WORKERS = int(os.environ.get("DUAL_MAX_WORKERS", "8"))
+
+# persona fields carried unchanged into each week's updated_persona
+_PERSONA_KEEP_KEYS = (
+    "Age_band", "Sex", "BMI", "Days_per_week", "Current_fitness_level",
+    "Primary_goal", "Adherence_propensity", "Cooking_skill", "Budjet_SAR_per_day",
+)
+
 def _diversity_tag(pid: str, week_id: str) -> str:
     """
     Deterministic tag used to push variety in HF prompt.
@@ -44,7 +55,21 @@ def build_diet_prompt(updated_persona: dict, week_id: str, pid: str) -> str:
         f"[WEEK]={week_id}\n[PERSONA]={updated_persona}"
     )
 
-def simulate_progress(updated_persona: dict, diet: dict, week_id: str, workouts: List[str]) -> Tuple[dict, dict]:
+def _seed(key: str) -> int:
+    return int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:16], 16)
+
+def progress_scales(seed_keys: Sequence[str]) -> np.ndarray:
+    """
+    (len(seed_keys), 3) factors in [0.6, 1.4) for the weight/muscle/fat deltas.
+    Each row comes from its own PCG64 stream seeded by its key, so a persona-week's
+    factors do not depend on which other personas share the call or their order.
+    """
+    draws = np.stack([np.random.default_rng(_seed(k)).random(3) for k in seed_keys]) if seed_keys else np.empty((0, 3))
+    return 0.6 + 0.8 * draws
+
+def simulate_progress(updated_persona: dict, diet: dict, week_id: str, workouts: List[str],
+                      scales: Optional[Sequence[float]] = None,
+                      stamp: Optional[Tuple[str, str]] = None) -> Tuple[dict, dict]:
     pid = (updated_persona.get("ID") or updated_persona.get("id") or "PXX")
 
     # Numeric baselines with safe casting
@@ -66,19 +91,19 @@ def simulate_progress(updated_persona: dict, diet: dict, week_id: str, workouts:
     adh_factor   = 0.7 if "low" in adherence else (1.1 if "high" in adherence else 1.0)
     sleep_factor = 0.9 if sleep_h < 6 else (1.05 if sleep_h >= 8 else 1.0)
 
-    import random
     seed_key = f"{pid}-{week_id}"
-    rnd = random.Random(seed_key)
+    # run_full_year passes this persona's row of the week's draws; standalone calls draw their own
+    s_w, s_m, s_f = scales if scales is not None else progress_scales([seed_key])[0].tolist()
 
-    dw = round(adj * adh_factor * sleep_factor * (0.6 + 0.8 * rnd.random()), 2)
-    dm = round((0.15 if "muscle" in goal else -0.05) * adh_factor * sleep_factor * (0.6 + 0.8 * rnd.random()), 2)
-    df = round((-0.4 if "fat" in goal else (-0.1 if "recomp" in goal else 0.0)) * adh_factor * sleep_factor * (0.6 + 0.8 * rnd.random()), 2)
+    dw = round(adj * adh_factor * sleep_factor * s_w, 2)
+    dm = round((0.15 if "muscle" in goal else -0.05) * adh_factor * sleep_factor * s_m, 2)
+    df = round((-0.4 if "fat" in goal else (-0.1 if "recomp" in goal else 0.0)) * adh_factor * sleep_factor * s_f, 2)
 
     post_w = round(pre_w + dw, 2)
     post_m = max(0.0, round(pre_m + dm, 2))
     post_f = max(3.0, round(pre_f + df, 2))
 
-    date_str, time_str = stamp_riyadh()
+    date_str, time_str = stamp or stamp_riyadh()
     daily_avg_kcal = diet.get("Total_kcal_target_kcal") or 2200
 
     fb = generate_feedback(updated_persona, diet, workouts, seed_key)
@@ -95,29 +120,35 @@ def simulate_progress(updated_persona: dict, diet: dict, week_id: str, workouts:
         "sleep_avg_hours": sleep_h,
     }
 
-    updated = {
-        "Age_band": updated_persona.get("Age_band"),
-        "Sex": updated_persona.get("Sex"),
-        "BMI": updated_persona.get("BMI"),
-        "Days_per_week": updated_persona.get("Days_per_week"),
-        "Current_fitness_level": updated_persona.get("Current_fitness_level"),
-        "Primary_goal": updated_persona.get("Primary_goal"),
-        "Adherence_propensity": updated_persona.get("Adherence_propensity"),
-        "Cooking_skill": updated_persona.get("Cooking_skill"),
-        "Budjet_SAR_per_day": updated_persona.get("Budjet_SAR_per_day"),
-        "Weight_kg": post_w,
-        "Muscle_mass_kg": post_m,
-        "Fat_percent": post_f,
-        "Sleep_hours": sleep_h,
-        "notes": fb["notes"],
-    }
+    updated = {k: updated_persona.get(k) for k in _PERSONA_KEEP_KEYS}
+    updated.update(Weight_kg=post_w, Muscle_mass_kg=post_m, Fat_percent=post_f,
+                   Sleep_hours=sleep_h, notes=fb["notes"])
     return logs, updated
 
-def write_diet_with_meta(pid: str, week_id: str, diet: dict):
-    date_str, time_str = stamp_riyadh()
+def write_diet_with_meta(pid: str, week_id: str, diet: dict, batch=None,
+                         stamp: Optional[Tuple[str, str]] = None):
+    date_str, time_str = stamp or stamp_riyadh()
     payload = {"Date": date_str, "Time": time_str, "Note": "Nutritionist comments embedded in raw text."}
     payload.update(diet)
-    write_diet(pid, week_id, payload)
+    raw_text = payload.pop("raw_text", None)  # kept out of the hot diet doc
+    write_diet(pid, week_id, payload, batch=batch)
+    if raw_text:
+        write_diet_raw(pid, week_id, raw_text, batch=batch)
+
+def _process_persona_week(pid: str, week_id: str, updated_persona: dict, scales: Sequence[float],
+                          stamp: Tuple[str, str]) -> None:
+    wlist = workouts_for(updated_persona.get("Days_per_week"))
+    prompt = build_diet_prompt(updated_persona, week_id, pid)
+
+    diet = get_diet_from_ace(prompt, pid=pid, week_id=week_id, retries=2)
+    logs, upd = simulate_progress(updated_persona, diet, week_id, wlist, scales, stamp=stamp)
+
+    # diet (+ raw text), logs and updated_persona land in one commit
+    batch = new_batch()
+    write_diet_with_meta(pid, week_id, diet, batch=batch, stamp=stamp)
+    write_logs(pid, week_id, logs, batch=batch)
+    write_updated_persona(pid, week_id, upd, batch=batch)
+    commit_batch(batch)
 
 def run_full_year():
     personas = list_persona_ids()
@@ -126,20 +157,25 @@ def run_full_year():
     weeks = week_id_sequence(START_WEEK_ID, TOTAL_WEEKS, INCLUDE_START_WEEK)
     for week_id in weeks:
         print(f"\n================= {week_id} =================")
-        for pid in personas:
-            updated_persona = read_updated_persona(pid, week_id) or read_persona(pid)
-
-            wlist = workouts_for(updated_persona.get("Days_per_week"))
-            prompt = build_diet_prompt(updated_persona, week_id, pid)
-
-            diet = get_diet_from_ace(prompt, pid=pid, week_id=week_id, retries=2)
-            write_diet_with_meta(pid, week_id, diet)
-
-            logs, upd = simulate_progress(updated_persona, diet, week_id, wlist)
-            write_logs(pid, week_id, logs)
-            write_updated_persona(pid, week_id, upd)
-
-            print(f"[OK] Week {week_id} :: {pid} -> diet/logs/updated_persona saved")
+        # all of this week's persona docs in two batched reads instead of up to 2 per persona
+        persona_docs = read_updated_personas(personas, week_id)
+        # progress randomness per persona-week, same keys simulate_progress uses standalone
+        scales = progress_scales([f"{pid}-{week_id}" for pid in personas]).tolist()
+        stamp = stamp_riyadh()  # one Date/Time for every doc of this weekly batch
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(personas)))) as ex:
+            futures = {
+                ex.submit(_process_persona_week, pid, week_id, persona_docs.get(pid) or {}, scales[i], stamp): pid
+                for i, pid in enumerate(personas)
+            }
+            for fut in as_completed(futures):
+                pid = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    # one failed persona must not abort the rest of the week
+                    print(f"[ERROR] Week {week_id} :: {pid} -> {type(e).__name__}: {e}")
+                else:
+                    print(f"[OK] Week {week_id} :: {pid} -> diet/logs/updated_persona saved")
 
 if __name__ == "__main__":
     run_full_year()
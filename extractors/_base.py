@@ -0,0 +1,146 @@
+"""
+Shared plumbing for the Firestore -> CSV extractors.
+
+Each extract_*.py script keeps its own fetch_*() generator and CSV columns and describes
+itself as an Extract. run_all() initializes Firebase once and streams every export through
+the same client, so several extracts can run back to back in one process (extract_all.py).
+"""
+import os
+import csv
+import logging
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.field_path import FieldPath  # not re-exported by firebase_admin.firestore
+
+# === CONFIGURATION ===
+
+# Path to your service account JSON file
+SERVICE_ACCOUNT_FILE = r"C:\Users\fakias0a\secrets\fitech-2nd-trail-e978c70041a0.json"
+
+# Firestore project ID
+PROJECT_ID = "fitech-2nd-trail"
+
+# Output directory for all CSV files
+OUTPUT_DIR = r"C:\Users\fakias0a\PycharmProjects\Resluts"
+
+# '.../users/{user_id}/weeks/{week_number}/...' anywhere in a document path
+_USER_WEEK_RE = re.compile(r"/users/([^/]+)/weeks/([^/]+)/")
+
+
+class Extract(NamedTuple):
+    """One Firestore -> CSV export."""
+    title: str
+    fetch: Callable[..., Iterable[Sequence]]  # fetch(db) -> row tuples in fieldnames order
+    fieldnames: Sequence[str]
+    out_csv: str
+    empty_hint: Sequence[str] = ()  # lines printed when no rows were written
+
+
+def init_firestore():
+    """
+    Initialize Firestore using the Firebase Admin SDK and return a client.
+    This will only initialize once even if called multiple times.
+    """
+    if not firebase_admin._apps:
+        print("[INIT] Initializing Firebase app...")
+        cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
+        firebase_admin.initialize_app(cred, {"projectId": PROJECT_ID})
+    else:
+        print("[INIT] Firebase app already initialized.")
+
+    return firestore.client()
+
+
+def scope_to_experiment(db, query, experiment_doc: str):
+    """
+    Restrict a collection_group query to documents under experiment_doc on the server.
+
+    Document names sort by path segment, so every descendant of experiment_doc falls in
+    [experiment_doc, experiment_doc + '\uf8ff'). Other experiments are never sent to us.
+    """
+    name = FieldPath.document_id()
+    return (
+        query
+        .where(filter=firestore.FieldFilter(name, ">=", db.document(experiment_doc)))
+        .where(filter=firestore.FieldFilter(name, "<", db.document(experiment_doc + "\uf8ff")))
+    )
+
+
+def field_mask(fields: Sequence[str]) -> List[str]:
+    """
+    Field paths for Query.select(). select() parses each entry as a dotted path, where a bare
+    segment must look like an identifier, so names such as '1st_meal' come back backquoted.
+    """
+    return [FieldPath(f).to_api_repr() for f in fields]
+
+
+def parse_user_and_week_from_path(path: str):
+    """
+    Given a Firestore document path like:
+        experiments/Experiment_OpenAI/users/U01/weeks/Week1/diet/plan
+
+    Extract:
+        user_id  = U01
+        week_num = Week1
+
+    Returns (None, None) when there is no 'users/{id}/weeks/{id}/' pattern in the path.
+    """
+    m = _USER_WEEK_RE.search(path)
+    return (m.group(1), m.group(2)) if m else (None, None)
+
+
+def write_csv(out_csv: str, fieldnames: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """
+    Stream row tuples into out_csv under a fieldnames header.
+    Returns the number of rows written. Rows go to a temp file that replaces out_csv only
+    once at least one row was written, so an empty (or failed) export leaves an existing
+    CSV untouched.
+    """
+    print(f"[STEP] Writing data to CSV at: {out_csv}")
+    os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    tmp_csv = out_csv + ".tmp"
+
+    # 1 MiB buffer: rows coalesce in userspace instead of one write() per 8 KiB
+    total = 0
+    try:
+        with open(tmp_csv, mode="w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            for total, row in enumerate(rows, start=1):
+                writer.writerow(row)
+                if total % 1000 == 0:
+                    print(f"[WRITE]   Wrote {total} row(s)...")
+        if total:
+            os.replace(tmp_csv, out_csv)
+    finally:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+
+    if total:
+        print(f"[DONE] CSV file creation completed ({total} row(s)).")
+    return total
+
+
+def run(extract: Extract, db) -> int:
+    """Stream one extract's rows from Firestore straight into its CSV."""
+    print(f"=== {extract.title} ===")
+    written = write_csv(extract.out_csv, extract.fieldnames, extract.fetch(db))
+
+    if not written:
+        print("\n[RESULT] No rows were found containing the target fields.")
+        for line in extract.empty_hint:
+            print(f"         {line}")
+    else:
+        print(f"\n✅ Done. Wrote {written} row(s) to:")
+        print(f"   {extract.out_csv}")
+    return written
+
+
+def run_all(extracts: Sequence[Extract]) -> Dict[str, int]:
+    """Run several extracts over one Firestore client; returns {out_csv: rows written}."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = init_firestore()
+    return {extract.out_csv: run(extract, db) for extract in extracts}
@@ -0,0 +1,23 @@
+from _base import run_all
+
+import extract_diet
+import extract_diet_ACEgpt_ACEgpt
+import extract_diet_ACEgpt_Claude
+import extract_log_ACEgpt_ACEgpt
+import extract_updated_persona_ACEgpt_Claude
+
+# === Run the diet, ACEgpt diet/logs and ACEgpt_Claude diet/updated_persona exports over one Firestore client ===
+
+
+def main():
+    run_all([
+        extract_diet.EXTRACT,
+        extract_diet_ACEgpt_ACEgpt.EXTRACT,
+        extract_log_ACEgpt_ACEgpt.EXTRACT,
+        extract_diet_ACEgpt_Claude.EXTRACT,
+        extract_updated_persona_ACEgpt_Claude.EXTRACT,
+    ])
+
+
+if __name__ == "__main__":
+    main()
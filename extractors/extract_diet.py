@@ -1,19 +1,13 @@
 import os
-import csv
+import logging
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 
-# === CONFIGURATION ===
-
-# Path to your service account JSON file
-SERVICE_ACCOUNT_FILE = r"C:\Users\fakias0a\secrets\fitech-2nd-trail-e978c70041a0.json"
+from _base import OUTPUT_DIR, Extract, parse_user_and_week_from_path, run_all
 
-# Firestore project ID
-PROJECT_ID = "fitech-2nd-trail"
+# === CONFIGURATION ===
 
-# Output directory and CSV file path
-OUTPUT_DIR = r"C:\Users\fakias0a\PycharmProjects\Resluts"
+# CSV file path (service account, project and output directory live in _base)
 OUTPUT_CSV = os.path.join(OUTPUT_DIR, "diet_results.csv")
 
 # All diet-related fields we want to extract from the 'plan' document
@@ -54,55 +48,11 @@ DIET_FIELDS = [
     "Total_sodium_mg",
     "Note",
 ]
+# Same fields as a set: docs usually carry far fewer keys than DIET_FIELDS, so test from the doc side
+DIET_KEYS = frozenset(DIET_FIELDS)
 
-
-def init_firestore():
-    """
-    Initialize Firestore using the Firebase Admin SDK and return a client.
-    This will only initialize once even if called multiple times.
-    """
-    if not firebase_admin._apps:
-        print("[INIT] Initializing Firebase app...")
-        cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
-        firebase_admin.initialize_app(cred, {"projectId": PROJECT_ID})
-    else:
-        print("[INIT] Firebase app already initialized.")
-
-    return firestore.client()
-
-
-def parse_user_and_week_from_path(path: str):
-    """
-    Given a Firestore document path like:
-        experiments/Experiment_OpenAI/users/U01/weeks/Week1/diet/plan
-
-    Extract:
-        user_id  = U01
-        week_num = Week1
-
-    This function is robust as long as there is a 'users/{id}/weeks/{id}/diet/{doc}'
-    pattern somewhere in the path.
-    """
-    segments = path.split("/")  # e.g. ['experiments', 'Experiment_OpenAI', 'users', 'U01', 'weeks', 'Week1', 'diet', 'plan']
-
-    user_id = None
-    week_number = None
-
-    try:
-        users_idx = segments.index("users")
-        user_id = segments[users_idx + 1]
-    except ValueError:
-        # 'users' not found
-        pass
-
-    try:
-        weeks_idx = segments.index("weeks")
-        week_number = segments[weeks_idx + 1]
-    except ValueError:
-        # 'weeks' not found
-        pass
-
-    return user_id, week_number
+# Per-doc details go to DEBUG; run_all() configures INFO, so they cost nothing by default
+log = logging.getLogger(__name__)
 
 
 def fetch_diet_data(db):
@@ -113,41 +63,34 @@ def fetch_diet_data(db):
     For every document under a 'diet' collection:
       - Check if it has at least one of the DIET_FIELDS (so we know it's a diet plan).
       - Parse user_id and week_number from the path.
-      - Collect all DIET_FIELDS into a row for the CSV.
+      - Collect all DIET_FIELDS into a row tuple for the CSV and yield it as docs arrive.
+
+    The query is ordered by document name (experiment, user, then week), so the
+    Firestore index does the sorting and rows need no buffering.
     """
-    rows = []
+    accepted = 0
 
     print("[STEP] Listing top-level collections for info...")
     top_collections = [c.id for c in db.collections()]
     print(f"[INFO] Top-level collections: {top_collections}")
 
     print("\n[STEP] Searching across ALL 'diet' subcollections (collection_group('diet'))...")
-    diet_query = db.collection_group("diet")
+    diet_query = db.collection_group("diet").order_by(FieldPath.document_id())
 
-    # Stream all documents in any 'diet' collection
-    docs = list(diet_query.stream())
-    total_docs = len(docs)
-    print(f"[INFO] Found {total_docs} document(s) inside collections named 'diet'.")
-
-    if total_docs == 0:
-        print("[WARN] There are no documents in any 'diet' collection. "
-              "Either the data is stored elsewhere or the collection name is different.")
-        return rows
-
-    for idx, doc in enumerate(docs, start=1):
+    # Stream all documents in any 'diet' collection; docs are filtered as they arrive, never buffered
+    total_docs = 0
+    for idx, doc in enumerate(diet_query.stream(), start=1):
+        total_docs = idx
         path = doc.reference.path
         data = doc.to_dict() or {}
 
-        # Show progress every few docs (and for the first few docs)
-        if idx <= 10 or idx % 50 == 0 or idx == total_docs:
-            print(f"\n[DOC {idx}/{total_docs}] Path: {path}")
-            print(f"[DOC {idx}/{total_docs}] Fields: {list(data.keys())}")
+        # Per-doc trace is lazy DEBUG; one progress line per 512 docs
+        log.debug("[DOC %d] Path: %s | Fields: %s", idx, path, data.keys())
+        if (idx & 511) == 0:
+            print(f"[PROGRESS] Scanned {idx} document(s)...")
 
-        # Check if this doc has at least one of the DIET_FIELDS
-        has_any_diet_field = any(
-            (field in data and data[field] is not None) for field in DIET_FIELDS
-        )
-        if not has_any_diet_field:
+        # Check if this doc has at least one of the DIET_FIELDS set (one pass over the doc's own keys)
+        if DIET_KEYS.isdisjoint(k for k, v in data.items() if v is not None):
             # Not a diet plan document we're interested in
             continue
 
@@ -157,73 +100,38 @@ def fetch_diet_data(db):
             print(f"[WARN] Could not parse user/week from path (skipping): {path}")
             continue
 
-        # Build a row with user_id, week_number, and all diet fields
-        row = {
-            "user_id": user_id,
-            "week_number": week_number,
-        }
-
-        for field in DIET_FIELDS:
-            row[field] = data.get(field)
-
-        print(f"[OK]   Diet plan found for user={user_id}, week={week_number}")
-        rows.append(row)
-
-    # Sort by user_id first, then by week_number (as string)
-    rows.sort(key=lambda r: (r["user_id"], str(r["week_number"])))
-
-    print(f"\n[SUMMARY] Total diet plan rows: {len(rows)}")
-    return rows
+        # Build a row tuple in CSV column order: user_id, week_number, then all diet fields
+        row = (user_id, week_number, *(data.get(field) for field in DIET_FIELDS))
 
+        log.debug("[OK]   Diet plan found for user=%s, week=%s", user_id, week_number)
+        accepted += 1
+        yield row
 
-def write_csv(rows):
-    """
-    Write the collected rows into a CSV file with headers:
-    'user id', 'Week number', and all DIET_FIELDS.
-    """
-    print(f"[STEP] Writing data to CSV at: {OUTPUT_CSV}")
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    fieldnames = ["user id", "Week number"] + DIET_FIELDS
-
-    with open(OUTPUT_CSV, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        total = len(rows)
-        for idx, r in enumerate(rows, start=1):
-            out_row = {
-                "user id": r["user_id"],
-                "Week number": r["week_number"],
-            }
-            # Add all diet fields, even if some are None
-            for field in DIET_FIELDS:
-                out_row[field] = r.get(field)
+    print(f"[INFO] Scanned {total_docs} document(s) inside collections named 'diet'.")
+    if total_docs == 0:
+        print("[WARN] There are no documents in any 'diet' collection. "
+              "Either the data is stored elsewhere or the collection name is different.")
+        return
 
-            writer.writerow(out_row)
+    print(f"\n[SUMMARY] Total diet plan rows: {accepted}")
 
-            # Progress while writing
-            if total > 0 and (idx % 10 == 0 or idx == total):
-                print(f"[WRITE]   Wrote {idx}/{total} row(s)...")
 
-    print("[DONE] CSV file creation completed.")
+EXTRACT = Extract(
+    title="Extract diet plan from Firestore to CSV (collection_group 'diet')",
+    fetch=fetch_diet_data,
+    fieldnames=("user id", "Week number", *DIET_FIELDS),
+    out_csv=OUTPUT_CSV,
+    empty_hint=(
+        "This might mean:",
+        "- The field names differ slightly from DIET_FIELDS.",
+        "- The docs with those fields are not under collections named 'diet'.",
+        "- Or the data is stored in another place.",
+    ),
+)
 
 
 def main():
-    print("=== Extract diet plan from Firestore to CSV (collection_group 'diet') ===")
-    db = init_firestore()
-    rows = fetch_diet_data(db)
-
-    if not rows:
-        print("\n[RESULT] No rows were found with diet fields.")
-        print("         This might mean:")
-        print("         - The field names differ slightly from DIET_FIELDS.")
-        print("         - The docs with those fields are not under collections named 'diet'.")
-        print("         - Or the data is stored in another place.")
-    else:
-        write_csv(rows)
-        print(f"\n✅ Done. Wrote {len(rows)} row(s) to:")
-        print(f"   {OUTPUT_CSV}")
+    run_all([EXTRACT])
 
 
 if __name__ == "__main__":
@@ -96,12 +96,10 @@ def fetch_log_data(db):
 
     for idx, doc in enumerate(docs, start=1):
         path = doc.reference.path
-        data = doc.to_dict() or {}
 
         # Show progress for some docs
         if idx <= 10 or idx % 50 == 0 or idx == total_docs:
             print(f"\n[DOC {idx}/{total_docs}] Path: {path}")
-            print(f"[DOC {idx}/{total_docs}] Fields: {list(data.keys())}")
 
         segments = path.split("/")
 
@@ -119,6 +117,9 @@ def fetch_log_data(db):
             print(f"[WARN] Could not parse user/week from path (skipping): {path}")
             continue
 
+        # Path filters passed: only now convert the document's fields
+        data = doc.to_dict() or {}
+
         post_fat_pct       = data.get("Post_fat_pct")
         post_muscle_kg     = data.get("Post_muscle_kg")
         post_weight_kg     = data.get("Post_weight_kg")
@@ -192,7 +193,7 @@ def write_csv(rows):
         "notes",
     ]
 
-    with open(OUTPUT_CSV, mode="w", newline="", encoding="utf-8") as f:
+    with open(OUTPUT_CSV, mode="w", newline="", encoding="utf-8", buffering=1 << 20) as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
 
@@ -211,7 +212,7 @@ def write_csv(rows):
                     "notes": r["notes"],
                 }
             )
-            if total > 0 and (idx % 10 == 0 or idx == total):
+            if total > 0 and (idx % 1000 == 0 or idx == total):
                 print(f"[WRITE]   Wrote {idx}/{total} row(s)...")
 
     print("[DONE] CSV file creation completed.")
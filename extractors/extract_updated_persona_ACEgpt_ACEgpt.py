@@ -91,12 +91,10 @@ def fetch_updated_persona_data(db):
 
     for idx, doc in enumerate(docs, start=1):
         path = doc.reference.path
-        data = doc.to_dict() or {}
 
         # Show progress for some docs
         if idx <= 10 or idx % 50 == 0 or idx == total_docs:
             print(f"\n[DOC {idx}/{total_docs}] Path: {path}")
-            print(f"[DOC {idx}/{total_docs}] Fields: {list(data.keys())}")
 
         segments = path.split("/")
 
@@ -114,6 +112,9 @@ def fetch_updated_persona_data(db):
             print(f"[WARN] Could not parse user/week from path (skipping): {path}")
             continue
 
+        # Path filters passed: only now convert the document's fields
+        data = doc.to_dict() or {}
+
         adherence_propensity   = data.get("Adherence_propensity")
         age_band               = data.get("Age_band")
         bmi                    = data.get("BMI")
@@ -200,7 +201,7 @@ def write_csv(rows):
         "Sleep_hours",
     ]
 
-    with open(OUTPUT_CSV, mode="w", newline="", encoding="utf-8") as f:
+    with open(OUTPUT_CSV, mode="w", newline="", encoding="utf-8", buffering=1 << 20) as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
 
@@ -222,7 +223,7 @@ def write_csv(rows):
                     "Sleep_hours": r["Sleep_hours"],
                 }
             )
-            if total > 0 and (idx % 10 == 0 or idx == total):
+            if total > 0 and (idx % 1000 == 0 or idx == total):
                 print(f"[WRITE]   Wrote {idx}/{total} row(s)...")
 
     print("[DONE] CSV file creation completed.")
@@ -0,0 +1,33 @@
+# Run with pytest, or directly: python test_extract_queries.py
+# Queries are only built, never run: the client has anonymous credentials and no RPC is sent.
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore import Client
+
+import extract_diet_ACEgpt_ACEgpt
+import extract_diet_ACEgpt_Claude
+from _base import field_mask
+
+
+def _offline_client():
+    return Client(project="test-project", credentials=AnonymousCredentials())
+
+
+def test_field_mask_quotes_only_non_identifiers():
+    assert field_mask(["1st_meal", "2nd_meal_carbs_g", "Note", "Total_fat_g"]) == [
+        "`1st_meal`", "`2nd_meal_carbs_g`", "Note", "Total_fat_g",
+    ]
+
+
+def test_diet_queries_project_every_diet_field():
+    db = _offline_client()
+    for module in (extract_diet_ACEgpt_ACEgpt, extract_diet_ACEgpt_Claude):
+        # select() used to raise "Path 1st_meal not consumed" here
+        query = module.build_diet_query(db)
+        projected = [ref.field_path for ref in query._to_protobuf().select.fields]
+        assert projected == field_mask(module.DIET_FIELDS), module.__name__
+
+
+if __name__ == "__main__":
+    test_field_mask_quotes_only_non_identifiers()
+    test_diet_queries_project_every_diet_field()
+    print("[OK] extractor query checks passed")
@@ -0,0 +1,47 @@
+# Import the Firestore client to read/write documents in Google Cloud Firestore
+from google.cloud import firestore
+# Import helper to load Google service account credentials from a JSON key file
+from google.oauth2 import service_account
+# lru_cache turns get_db() into a process-wide singleton; the lock guards its first call
+from functools import lru_cache
+import threading
+# Thread pool used to commit independent write batches in parallel
+from concurrent.futures import ThreadPoolExecutor
+
+# ---- Configuration constants shared by the seed scripts (edit to your project/paths) ----
+
+# Your Google Cloud / Firebase project ID (must match the project of your Firestore)
+PROJECT_ID = "fitech-2nd-trail"
+# Absolute path to the service account key JSON for authenticated Firestore access
+SERVICE_ACCOUNT = r"C:\Users\fakias0a\PycharmProjects\seed_personas\fitech-2nd-trail-firebase-adminsdk-yrpaq-40560d84e7.json"
+
+# Lock so two threads calling get_db() at the same time don't both build a client
+_DB_LOCK = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _client() -> firestore.Client:
+    # Parse the service account JSON once and bind one client (one gRPC channel) to it
+    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT)
+    return firestore.Client(project=PROJECT_ID, credentials=creds)
+
+# Return the shared Firestore client, creating it on first use
+def get_db() -> firestore.Client:
+    with _DB_LOCK:
+        return _client()
+
+# Firestore rejects a batch with more than 500 writes; stay a little under the limit
+BATCH_CHUNK = 450
+
+# Commit (ref, data) writes as several batches of at most `chunk` ops, `workers` commits in flight at once
+def commit_in_chunks(db, ops, chunk: int = BATCH_CHUNK, workers: int = 4) -> int:
+    batches = []
+    for i in range(0, len(ops), chunk):
+        batch = db.batch()
+        for ref, data in ops[i:i + chunk]:
+            batch.set(ref, data, merge=False)   # replace the doc if it exists
+        batches.append(batch)
+    # Each batch is atomic on its own; the chunks are independent, so their round-trips can overlap
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as ex:
+        for fut in [ex.submit(b.commit) for b in batches]:
+            fut.result()                        # re-raise the first commit error, if any
+    return len(ops)
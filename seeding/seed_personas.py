@@ -1,33 +1,24 @@
-# Import the Firestore client to read/write documents in Google Cloud Firestore
-from google.cloud import firestore
-# Import helper to load Google service account credentials from a JSON key file
-from google.oauth2 import service_account
-# Import the standard library's JSON module for reading the personas file
-import json
+# Shared Firestore client (project ID + service account live in firestore_client.py)
+from firestore_client import get_db, commit_in_chunks
+# orjson parses the personas file in C (faster than the stdlib json module); Path reads it as raw bytes
+import orjson
+from pathlib import Path
 
 # ---- Configuration constants (edit to your project/paths) ----
 
-# Your Google Cloud / Firebase project ID (must match the project of your Firestore)
-PROJECT_ID = "fitech-2nd-trail"
 # Absolute path to the local JSON file that contains your 24 persona rows
 PERSONAS_JSON = r"C:\Users\fakias0a\PycharmProjects\seed_personas\personas_v3_with_prefs_20251029.json"
-# Absolute path to the service account key JSON for authenticated Firestore access
-SERVICE_ACCOUNT = r"C:\Users\fakias0a\PycharmProjects\seed_personas\fitech-2nd-trail-firebase-adminsdk-yrpaq-40560d84e7.json"
 
 # Define the main entry function that seeds personas into Firestore
 def main():
-    # Create credential object from the service account JSON so the client can authenticate
-    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT)
-    # Create a Firestore client bound to your project and using those credentials
-    db = firestore.Client(project=PROJECT_ID, credentials=creds)
+    # Reuse the process-wide Firestore client (credentials are loaded once, on first use)
+    db = get_db()
 
-    # Open the personas JSON file for reading with UTF-8 encoding
-    with open(PERSONAS_JSON, "r", encoding="utf-8") as f:
-        # Load the entire JSON array (list of persona dicts) into memory as Python objects
-        rows = json.load(f)
+    # Read the personas JSON file as bytes and parse the whole array (list of persona dicts) in one call
+    rows = orjson.loads(Path(PERSONAS_JSON).read_bytes())
 
-    # Start a Firestore batch so multiple writes can be committed atomically
-    batch = db.batch()
+    # Collect (doc_ref, data) writes; they are committed below in batches under the 500-op limit
+    ops = []
     # Iterate over each persona row (each row should be a dict with keys like "ID", etc.)
     for row in rows:
         # Extract the persona ID (e.g., "P01" .. "P24") which will be the Firestore doc ID
@@ -36,11 +27,11 @@ def main():
         row["schema_version"] = "v3"
         # Add a frozen timestamp/string to record when this snapshot was seeded
         row["frozen_at"] = "2025-10-29"
-        # Queue a write in the batch: set the document at personas/{pid} to exactly this row
-        # merge=False ensures the document is replaced by 'row' (not merged with existing fields)
-        batch.set(db.collection("personas").document(pid), row, merge=False)
-    # Execute all queued writes in a single network commit
-    batch.commit()
+        # Queue a write: set the document at personas/{pid} to exactly this row
+        # (commit_in_chunks uses merge=False, so the document is replaced, not merged)
+        ops.append((db.collection("personas").document(pid), row))
+    # Commit the queued writes in chunks, several chunks in parallel
+    commit_in_chunks(db, ops)
     # Print a simple success message with the number of personas seeded
     print("Seeded", len(rows), "personas")
 